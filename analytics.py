@@ -8,18 +8,20 @@ from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 from typing import Tuple, Dict, List
 
+from context import ReturnsLike, get_returns_context
 
-def calculate_correlation_matrix(returns: pd.DataFrame) -> pd.DataFrame:
+
+def calculate_correlation_matrix(returns: ReturnsLike) -> pd.DataFrame:
     """
     Calculate correlation matrix between assets
 
     Args:
-        returns: Historical returns DataFrame
+        returns: Historical returns DataFrame or ReturnsContext
 
     Returns:
         Correlation matrix DataFrame
     """
-    return returns.corr()
+    return get_returns_context(returns).corr
 
 
 def perform_pca(returns: pd.DataFrame, n_components: int = 3) -> Tuple[PCA, pd.DataFrame, np.ndarray]:
@@ -104,38 +106,33 @@ def cluster_assets(
     return labels, cluster_df
 
 
-def calculate_diversification_ratio(returns: pd.DataFrame, weights: Dict[str, float]) -> float:
+def calculate_diversification_ratio(returns: ReturnsLike, weights: Dict[str, float]) -> float:
     """
     Calculate portfolio diversification ratio
 
     Diversification Ratio = (Weighted Average Volatility) / (Portfolio Volatility)
 
     Args:
-        returns: Historical returns DataFrame
+        returns: Historical returns DataFrame or ReturnsContext
         weights: Portfolio weights
 
     Returns:
         Diversification ratio
     """
-    tickers = list(weights.keys())
-    available_tickers = [t for t in tickers if t in returns.columns]
+    # Align data
+    context, weights_array = get_returns_context(returns).align(weights)
 
-    if not available_tickers:
+    if context is None:
         return 0.0
 
-    # Align data
-    returns_subset = returns[available_tickers]
-    weights_array = np.array([weights[t] for t in available_tickers])
-    weights_array = weights_array / weights_array.sum()
-
     # Individual volatilities
-    volatilities = returns_subset.std().values * np.sqrt(252)
+    volatilities = context.std * np.sqrt(252)
 
     # Weighted average volatility
     weighted_avg_vol = weights_array @ volatilities
 
     # Portfolio volatility
-    cov_matrix = returns_subset.cov().values * 252
+    cov_matrix = context.annual_cov
     portfolio_vol = np.sqrt(weights_array @ cov_matrix @ weights_array)
 
     if portfolio_vol > 0:
@@ -144,30 +141,25 @@ def calculate_diversification_ratio(returns: pd.DataFrame, weights: Dict[str, fl
         return 0.0
 
 
-def calculate_contribution_to_risk(returns: pd.DataFrame, weights: Dict[str, float]) -> pd.DataFrame:
+def calculate_contribution_to_risk(returns: ReturnsLike, weights: Dict[str, float]) -> pd.DataFrame:
     """
     Calculate each asset's contribution to portfolio risk
 
     Args:
-        returns: Historical returns DataFrame
+        returns: Historical returns DataFrame or ReturnsContext
         weights: Portfolio weights
 
     Returns:
         DataFrame with risk contributions
     """
-    tickers = list(weights.keys())
-    available_tickers = [t for t in tickers if t in returns.columns]
+    # Align data
+    context, weights_array = get_returns_context(returns).align(weights)
 
-    if not available_tickers:
+    if context is None:
         return pd.DataFrame()
 
-    # Align data
-    returns_subset = returns[available_tickers]
-    weights_array = np.array([weights[t] for t in available_tickers])
-    weights_array = weights_array / weights_array.sum()
-
     # Covariance matrix
-    cov_matrix = returns_subset.cov().values * 252
+    cov_matrix = context.annual_cov
 
     # Portfolio variance
     portfolio_variance = weights_array @ cov_matrix @ weights_array
@@ -184,7 +176,7 @@ def calculate_contribution_to_risk(returns: pd.DataFrame, weights: Dict[str, flo
 
     # Create DataFrame
     risk_df = pd.DataFrame({
-        'Ticker': available_tickers,
+        'Ticker': context.tickers,
         'Weight (%)': weights_array * 100,
         'Marginal Risk': mcr,
         'Risk Contribution': ccr,
@@ -15,19 +15,27 @@ import seaborn as sns
 from data_yf import (
     fetch_stock_data, fetch_multiple_stocks, get_current_price,
     search_ticker, get_stock_info, get_returns_dataframe, get_last_refresh_time,
-    search_stock_suggestions
+    search_stock_suggestions, get_sector_map
 )
 from portfolio import Portfolio, calculate_portfolio_stats, calculate_asset_stats
-from simulate import monte_carlo_gbm, historical_bootstrap, calculate_percentile_bands
+from simulate import (
+    monte_carlo_gbm, monte_carlo_adaptive, monte_carlo_sweep, monte_carlo_student_t,
+    monte_carlo_garch, monte_carlo_regime_switching, historical_bootstrap, bootstrap_scenarios,
+    simulate_rebalanced_portfolio, SimulationCache, run_cached_simulation,
+    VARIANCE_REDUCTION_METHODS
+)
 from optimize import (
-    optimize_max_sharpe, optimize_min_variance, generate_efficient_frontier,
-    calculate_portfolio_performance
+    optimize_max_sharpe, optimize_min_variance, optimize_risk_parity, optimize_hrp, optimize_cvar, efficient_frontier_cla,
+    calculate_portfolio_performance, get_constrained_optimizer, DEFAULT_FACTORS
 )
 from analytics import (
     calculate_correlation_matrix, perform_pca, cluster_assets,
     calculate_diversification_ratio, calculate_contribution_to_risk,
     analyze_sector_exposure
 )
+from charts import decimate_series, histogram_bins
+from context import get_returns_context
+from stress import run_stress_tests, rolling_window_losses
 from report import generate_markdown_report, generate_weights_csv, generate_holdings_csv
 from insights import (
     interpret_sharpe_ratio, interpret_volatility, interpret_annual_return,
@@ -312,6 +320,22 @@ if 'returns_data' not in st.session_state:
 if 'last_refresh' not in st.session_state:
     st.session_state.last_refresh = None
 
+
+# Monte Carlo engines offered in the Simulate tab
+MC_ENGINES = {
+    "GBM (Gaussian)": monte_carlo_gbm,
+    "Student-t (fat tails)": monte_carlo_student_t,
+    "GARCH(1,1)": monte_carlo_garch,
+    "Regime Switching": monte_carlo_regime_switching,
+}
+
+
+@st.cache_resource
+def get_simulation_cache() -> SimulationCache:
+    """Simulation results shared by all sessions of this server process"""
+    return SimulationCache()
+
+
 # Sidebar
 with st.sidebar:
     st.image("https://img.icons8.com/3d-fluency/94/combo-chart--v1.png", width=80)
@@ -357,6 +381,7 @@ with st.sidebar:
         st.session_state.historical_data = {}
         st.session_state.returns_data = pd.DataFrame()
         st.cache_data.clear()
+        get_simulation_cache().clear()
         st.success("Data cache cleared!")
         st.rerun()
 
@@ -374,6 +399,9 @@ st.markdown('<div class="main-header">Portfolio Vision</div>', unsafe_allow_html
 st.markdown('<div class="sub-header">Investment Simulation & Optimization Dashboard</div>', unsafe_allow_html=True)
 st.markdown('<div class="banner"> EDUCATIONAL USE ONLY - Not Financial Advice</div>', unsafe_allow_html=True)
 
+# Means, covariances and correlations shared by every tab on this rerun
+returns_context = get_returns_context(st.session_state.returns_data)
+
 # Tabs
 tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
     "Home",
@@ -598,7 +626,7 @@ with tab2:
         if not st.session_state.returns_data.empty:
             weights = st.session_state.portfolio.get_weights()
             stats = calculate_portfolio_stats(
-                st.session_state.returns_data,
+                returns_context,
                 weights,
                 risk_free_rate
             )
@@ -713,7 +741,15 @@ with tab3:
             horizon_days = st.number_input("Horizon (Days)", min_value=1, max_value=1000, value=252, step=1)
 
         with col2:
-            n_simulations = st.number_input("Number of Paths", min_value=100, max_value=10000, value=1000, step=100)
+            path_mode = st.radio("Path Count", ["Fixed", "Target Precision"], horizontal=True)
+            if path_mode == "Fixed":
+                n_simulations = st.number_input("Number of Paths", min_value=100, max_value=10000, value=1000, step=100)
+            else:
+                target_precision = st.number_input(
+                    "P10/P50 Precision (±%)", min_value=0.1, max_value=5.0, value=0.5, step=0.1,
+                    help="Paths are added until the 95% confidence interval of P10 and P50 is this tight"
+                ) / 100
+                n_simulations = 1000
 
         with col3:
             return_tilt = st.number_input("Return Tilt (%)", min_value=-10.0, max_value=10.0, value=0.0, step=0.5) / 100
@@ -721,6 +757,27 @@ with tab3:
         with col4:
             volatility_tilt = st.number_input("Volatility Tilt", min_value=0.1, max_value=2.0, value=1.0, step=0.1)
 
+        col5, col6 = st.columns(2)
+
+        with col5:
+            engine_label = st.selectbox(
+                "Shock Model",
+                list(MC_ENGINES.keys()),
+                disabled=path_mode != "Fixed",
+                help="Gaussian GBM, fat-tailed Student-t shocks, or GARCH(1,1) volatility clustering. Target Precision mode uses GBM."
+            )
+            if path_mode != "Fixed":
+                engine_label = "GBM (Gaussian)"
+
+        with col6:
+            variance_reduction = st.selectbox(
+                "Variance Reduction",
+                VARIANCE_REDUCTION_METHODS,
+                index=VARIANCE_REDUCTION_METHODS.index('sobol'),
+                disabled=engine_label != "GBM (Gaussian)",
+                help="Sampling technique for GBM paths. Sobol and antithetic sampling reach the same precision with far fewer paths."
+            )
+
         # Run simulation button
         if st.button("Run Simulation", use_container_width=True):
             if st.session_state.returns_data.empty:
@@ -730,39 +787,85 @@ with tab3:
                     weights = st.session_state.portfolio.get_weights()
                     initial_value = st.session_state.portfolio.get_total_value()
 
+                    cache = get_simulation_cache()
+
                     # Monte Carlo
-                    mc_paths, mc_stats = monte_carlo_gbm(
-                        st.session_state.returns_data,
-                        weights,
-                        initial_value,
-                        horizon_days,
-                        n_simulations,
-                        return_tilt,
-                        volatility_tilt,
-                        random_seed
-                    )
+                    if path_mode == "Fixed" and engine_label == "GBM (Gaussian)":
+                        mc_result = run_cached_simulation(
+                            cache,
+                            monte_carlo_gbm,
+                            returns_context,
+                            weights,
+                            initial_value,
+                            horizon_days,
+                            n_simulations=n_simulations,
+                            return_tilt=return_tilt,
+                            volatility_tilt=volatility_tilt,
+                            seed=random_seed,
+                            variance_reduction=variance_reduction,
+                            precision='float32'
+                        )
+                    elif path_mode == "Fixed":
+                        mc_result = run_cached_simulation(
+                            cache,
+                            MC_ENGINES[engine_label],
+                            returns_context,
+                            weights,
+                            initial_value,
+                            horizon_days,
+                            n_simulations=n_simulations,
+                            return_tilt=return_tilt,
+                            volatility_tilt=volatility_tilt,
+                            seed=random_seed,
+                            precision='float32'
+                        )
+                    else:
+                        mc_result = run_cached_simulation(
+                            cache,
+                            monte_carlo_adaptive,
+                            returns_context,
+                            weights,
+                            initial_value,
+                            horizon_days,
+                            target_precision=target_precision,
+                            return_tilt=return_tilt,
+                            volatility_tilt=volatility_tilt,
+                            seed=random_seed,
+                            variance_reduction=variance_reduction,
+                            precision='float32'
+                        )
+                        # Bootstrap with as many paths as the precision target needed
+                        n_simulations = mc_result['stats'].get('n_simulations', n_simulations)
 
                     # Historical Bootstrap
-                    bs_paths, bs_stats = historical_bootstrap(
-                        st.session_state.returns_data,
+                    bs_result = run_cached_simulation(
+                        cache,
+                        historical_bootstrap,
+                        returns_context,
                         weights,
                         initial_value,
                         horizon_days,
-                        n_simulations,
-                        seed=random_seed
+                        n_simulations=n_simulations,
+                        seed=random_seed,
+                        precision='float32'
                     )
 
-                    st.session_state.mc_paths = mc_paths
-                    st.session_state.mc_stats = mc_stats
-                    st.session_state.bs_paths = bs_paths
-                    st.session_state.bs_stats = bs_stats
+                    st.session_state.mc_stats = mc_result['stats']
+                    st.session_state.mc_bands = mc_result['bands']
+                    st.session_state.mc_terminal_values = mc_result['terminal_values']
+                    st.session_state.bs_stats = bs_result['stats']
+                    st.session_state.sim_params = {
+                        'horizon_days': horizon_days,
+                        'n_simulations': n_simulations,
+                        'engine': engine_label
+                    }
 
                     st.success("Simulation complete!")
 
         # Display results
-        if 'mc_paths' in st.session_state:
+        if 'mc_bands' in st.session_state:
             st.markdown("---")
-            st.subheader("Monte Carlo (GBM) Results")
+            st.subheader(f"Monte Carlo Results: {st.session_state.sim_params['engine']}")
 
             col1, col2, col3, col4 = st.columns(4)
             stats = st.session_state.mc_stats
@@ -776,12 +879,35 @@ with tab3:
             with col4:
                 st.metric("Expected Value", f"${stats['mean']:,.2f}")
 
+            if 'var_95' in stats:
+                col1, col2, col3, col4 = st.columns(4)
+
+                with col1:
+                    st.metric("Value at Risk (95%)", f"${stats['var_95']:,.2f}",
+                              help="Loss exceeded in only 5% of simulated outcomes")
+                with col2:
+                    st.metric("Expected Shortfall (95%)", f"${stats['cvar_95']:,.2f}",
+                              help="Average loss in the worst 5% of simulated outcomes")
+                with col3:
+                    st.metric("Probability of Loss", f"{stats['prob_loss']:.1%}")
+                with col4:
+                    st.metric("Median Max Drawdown", f"{stats['max_drawdown_p50']:.1%}",
+                              help="Typical largest peak-to-trough decline along a simulated path")
+
+            st.caption(f"Standard error of the expected value: ${stats.get('std_error', 0):,.2f}")
+            if 'n_simulations' in stats:
+                status = "converged" if stats['converged'] else "stopped at the path or time limit"
+                st.caption(
+                    f"Adaptive run used {stats['n_simulations']:,} paths in {stats['elapsed_seconds']:.2f}s ({status}). "
+                    f"P10 ±{stats['p10_precision']:.2%}, P50 ±{stats['p50_precision']:.2%}"
+                )
+
             # Add simulation insights
             st.markdown("---")
             st.markdown("### Simulation Insights")
 
             initial_value = st.session_state.portfolio.get_total_value()
-            sim_insights = interpret_simulation_results(stats, initial_value, horizon_days)
+            sim_insights = interpret_simulation_results(stats, initial_value, st.session_state.sim_params['horizon_days'])
 
             # Display risk level
             risk_info = sim_insights['risk_level']
@@ -805,12 +931,13 @@ with tab3:
             st.markdown("### Projection Fan Chart")
             st.caption("Shows the range of possible portfolio values over time. The shaded area represents the 80% confidence interval (P10 to P90).")
 
-            percentile_df = calculate_percentile_bands(st.session_state.mc_paths, [10, 50, 90])
+            # Send at most MAX_CHART_POINTS points for the whole fan to the browser
+            percentile_df = decimate_series(st.session_state.mc_bands, 'Day', ['P10', 'P50', 'P90'])
 
             fig = go.Figure()
 
             # Add optimistic bound (P90) - upper boundary
-            fig.add_trace(go.Scatter(
+            fig.add_trace(go.Scattergl(
                 x=percentile_df['Day'],
                 y=percentile_df['P90'],
                 name='Optimistic (P90)',
@@ -821,7 +948,7 @@ with tab3:
             ))
 
             # Add pessimistic bound (P10) - lower boundary with fill
-            fig.add_trace(go.Scatter(
+            fig.add_trace(go.Scattergl(
                 x=percentile_df['Day'],
                 y=percentile_df['P10'],
                 name='80% Confidence Range',
@@ -833,7 +960,7 @@ with tab3:
             ))
 
             # Add median line (P50) - most prominent
-            fig.add_trace(go.Scatter(
+            fig.add_trace(go.Scattergl(
                 x=percentile_df['Day'],
                 y=percentile_df['P50'],
                 name='Expected (Median)',
@@ -843,7 +970,7 @@ with tab3:
             ))
 
             # Add boundary lines for clarity
-            fig.add_trace(go.Scatter(
+            fig.add_trace(go.Scattergl(
                 x=percentile_df['Day'],
                 y=percentile_df['P90'],
                 name='Optimistic Scenario (P90)',
@@ -852,7 +979,7 @@ with tab3:
                 hovertemplate='Day %{x}<br>Optimistic: $%{y:,.0f}<extra></extra>'
             ))
 
-            fig.add_trace(go.Scatter(
+            fig.add_trace(go.Scattergl(
                 x=percentile_df['Day'],
                 y=percentile_df['P10'],
                 name='Pessimistic Scenario (P10)',
@@ -902,12 +1029,18 @@ with tab3:
             # Histogram of terminal values
             st.markdown("### Distribution of Final Values")
 
-            terminal_values = st.session_state.mc_paths[:, -1]
+            terminal_values = st.session_state.mc_terminal_values
+
+            # Binned here so only 50 counts reach the browser, not every path
+            bins_df = histogram_bins(terminal_values, bins=50)
 
-            fig = go.Figure(data=[go.Histogram(
-                x=terminal_values,
-                nbinsx=50,
-                name='Terminal Values'
+            fig = go.Figure(data=[go.Bar(
+                x=bins_df['Center'],
+                y=bins_df['Count'],
+                width=bins_df['Width'],
+                name='Terminal Values',
+                customdata=bins_df[['Left', 'Right']],
+                hovertemplate='$%{customdata[0]:,.0f} - $%{customdata[1]:,.0f}<br>Count: %{y}<extra></extra>'
             )])
 
             fig.update_layout(
@@ -934,6 +1067,118 @@ with tab3:
             with col4:
                 st.metric("Expected Value", f"${bs_stats['mean']:,.2f}")
 
+        # Rebalancing and cash flows
+        st.markdown("---")
+        st.subheader("Rebalancing & Cash Flows")
+        st.caption("Tracks each holding separately, trades back to your current weights on a schedule, and charges transaction costs.")
+
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            rebalance = st.selectbox("Rebalancing", ["quarterly", "monthly", "annually", "threshold", "none"])
+        with col2:
+            rebalance_band = st.number_input(
+                "Drift Band (%)", min_value=1.0, max_value=25.0, value=5.0, step=1.0,
+                disabled=rebalance != "threshold"
+            ) / 100
+        with col3:
+            monthly_cash_flow = st.number_input("Monthly Contribution ($)", value=0.0, step=100.0,
+                                                help="Negative values are withdrawals")
+        with col4:
+            transaction_cost_bps = st.number_input("Transaction Cost (bps)", min_value=0.0, max_value=100.0, value=10.0, step=1.0)
+
+        if st.button("Run Rebalancing Simulation", use_container_width=True):
+            if st.session_state.returns_data.empty:
+                st.error("Please fetch data first from the Portfolio tab")
+            else:
+                with st.spinner("Simulating rebalanced portfolio..."):
+                    _, rb_stats = simulate_rebalanced_portfolio(
+                        returns_context,
+                        st.session_state.portfolio.get_weights(),
+                        st.session_state.portfolio.get_total_value(),
+                        horizon_days,
+                        n_simulations,
+                        rebalance=rebalance,
+                        threshold=rebalance_band,
+                        contribution=monthly_cash_flow,
+                        contribution_interval=21,
+                        transaction_cost=transaction_cost_bps / 10000,
+                        seed=random_seed
+                    )
+                    st.session_state.rb_stats = rb_stats
+
+        if 'rb_stats' in st.session_state:
+            rb_stats = st.session_state.rb_stats
+            col1, col2, col3, col4 = st.columns(4)
+
+            with col1:
+                st.metric("Median (P50)", f"${rb_stats['p50']:,.2f}")
+            with col2:
+                st.metric("Pessimistic (P10)", f"${rb_stats['p10']:,.2f}")
+            with col3:
+                st.metric("Avg. Trading Costs", f"${rb_stats['avg_costs']:,.2f}")
+            with col4:
+                st.metric("Avg. Rebalances", f"{rb_stats['avg_rebalances']:.1f}")
+
+            if rb_stats['prob_depleted'] > 0:
+                st.warning(f"{rb_stats['prob_depleted']:.1%} of simulated paths run out of money before the horizon.")
+
+        # Sensitivity sweep over tilts
+        st.markdown("---")
+        st.subheader("Sensitivity to Return and Volatility Assumptions")
+        st.caption("Every cell reuses the same random draws, so differences come only from the assumptions.")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            sweep_metric = st.selectbox(
+                "Show",
+                ["Median (P50)", "Pessimistic (P10)", "Probability of Loss", "Expected Shortfall (95%)"]
+            )
+        with col2:
+            sweep_grid = st.slider("Grid Size", min_value=3, max_value=15, value=10)
+
+        if st.button("Run Sensitivity Sweep", use_container_width=True):
+            if st.session_state.returns_data.empty:
+                st.error("Please fetch data first from the Portfolio tab")
+            else:
+                with st.spinner("Sweeping assumptions..."):
+                    st.session_state.sweep_results = monte_carlo_sweep(
+                        returns_context,
+                        st.session_state.portfolio.get_weights(),
+                        st.session_state.portfolio.get_total_value(),
+                        return_tilts=list(np.linspace(-0.05, 0.05, sweep_grid)),
+                        volatility_tilts=list(np.linspace(0.5, 1.5, sweep_grid)),
+                        horizons=[horizon_days],
+                        n_simulations=n_simulations,
+                        seed=random_seed
+                    )
+
+        if 'sweep_results' in st.session_state and not st.session_state.sweep_results.empty:
+            metric_column = {
+                "Median (P50)": 'p50',
+                "Pessimistic (P10)": 'p10',
+                "Probability of Loss": 'prob_loss',
+                "Expected Shortfall (95%)": 'cvar'
+            }[sweep_metric]
+            surface = st.session_state.sweep_results.pivot(
+                index='volatility_tilt', columns='return_tilt', values=metric_column
+            )
+
+            fig = go.Figure(data=[go.Heatmap(
+                z=surface.values,
+                x=[f"{rt * 100:+.1f}%" for rt in surface.columns],
+                y=[f"{vt:.2f}x" for vt in surface.index],
+                colorscale='RdYlGn_r' if metric_column in ('prob_loss', 'cvar') else 'RdYlGn',
+                hovertemplate='Return tilt %{x}<br>Volatility %{y}<br>%{z:,.2f}<extra></extra>'
+            )])
+            fig.update_layout(
+                title=f"{sweep_metric} at {st.session_state.sweep_results['horizon_days'].iloc[0]} Days",
+                xaxis_title="Return Tilt (annual)",
+                yaxis_title="Volatility Tilt"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
     else:
         st.info("Add stocks to your portfolio first to run simulations")
 
@@ -950,24 +1195,46 @@ with tab4:
         It can optimize for:
         - **Maximum Sharpe Ratio**: Best risk-adjusted returns
         - **Minimum Variance**: Lowest risk portfolio
+        - **Risk Parity**: Every holding contributes the same share of risk
+        - **Hierarchical Risk Parity**: Splits risk across clusters of similar holdings, no solver needed
         """)
 
-        col1, col2 = st.columns(2)
+        cov_labels = {
+            'Sample': 'sample',
+            'Ledoit-Wolf Shrinkage': 'ledoit_wolf',
+            'Oracle Approximating Shrinkage': 'oas',
+            'Statistical Factor Model': 'factor'
+        }
+        cov_method = cov_labels[st.selectbox(
+            "Covariance Estimator",
+            list(cov_labels.keys()),
+            help="Shrinkage and factor estimates are more stable than the sample covariance "
+                 "when there are many holdings relative to the length of the return history. "
+                 f"The factor model keeps up to {DEFAULT_FACTORS} principal components, "
+                 "fewer for small portfolios"
+        )]
+
+        col1, col2, col3, col4 = st.columns(4)
 
         with col1:
             if st.button("Optimize for Max Sharpe", use_container_width=True):
                 with st.spinner("Optimizing..."):
-                    max_sharpe_weights = optimize_max_sharpe(
-                        st.session_state.returns_data,
-                        risk_free_rate
+                    max_sharpe_result = optimize_max_sharpe(
+                        returns_context,
+                        risk_free_rate,
+                        return_details=True,
+                        cov_method=cov_method
                     )
+                    max_sharpe_weights = max_sharpe_result['weights']
                     st.session_state.max_sharpe_weights = max_sharpe_weights
+                    st.session_state.max_sharpe_diagnostics = max_sharpe_result
 
                     if max_sharpe_weights:
                         perf = calculate_portfolio_performance(
                             max_sharpe_weights,
-                            st.session_state.returns_data,
-                            risk_free_rate
+                            returns_context,
+                            risk_free_rate,
+                            cov_method
                         )
                         st.session_state.max_sharpe_performance = perf
                         st.success("Optimization complete!")
@@ -977,20 +1244,65 @@ with tab4:
         with col2:
             if st.button("Optimize for Min Variance", use_container_width=True):
                 with st.spinner("Optimizing..."):
-                    min_var_weights = optimize_min_variance(st.session_state.returns_data)
+                    min_var_weights = optimize_min_variance(
+                        returns_context,
+                        cov_method=cov_method
+                    )
                     st.session_state.min_var_weights = min_var_weights
 
                     if min_var_weights:
                         perf = calculate_portfolio_performance(
                             min_var_weights,
-                            st.session_state.returns_data,
-                            risk_free_rate
+                            returns_context,
+                            risk_free_rate,
+                            cov_method
                         )
                         st.session_state.min_var_performance = perf
                         st.success("Optimization complete!")
                     else:
                         st.error("Optimization failed")
 
+        with col3:
+            if st.button("Optimize for Risk Parity", use_container_width=True):
+                with st.spinner("Optimizing..."):
+                    risk_parity_result = optimize_risk_parity(
+                        returns_context,
+                        cov_method=cov_method,
+                        return_details=True
+                    )
+                    st.session_state.risk_parity_weights = risk_parity_result['weights']
+                    st.session_state.risk_parity_contributions = risk_parity_result['risk_contributions']
+
+                    if risk_parity_result['weights']:
+                        perf = calculate_portfolio_performance(
+                            risk_parity_result['weights'],
+                            returns_context,
+                            risk_free_rate,
+                            cov_method
+                        )
+                        st.session_state.risk_parity_performance = perf
+                        st.success("Optimization complete!")
+                    else:
+                        st.error("Optimization failed")
+
+        with col4:
+            if st.button("Optimize with HRP", use_container_width=True):
+                with st.spinner("Optimizing..."):
+                    hrp_weights = optimize_hrp(returns_context, cov_method=cov_method)
+                    st.session_state.hrp_weights = hrp_weights
+
+                    if hrp_weights:
+                        perf = calculate_portfolio_performance(
+                            hrp_weights,
+                            returns_context,
+                            risk_free_rate,
+                            cov_method
+                        )
+                        st.session_state.hrp_performance = perf
+                        st.success("Optimization complete!")
+                    else:
+                        st.error("Optimization failed")
+
         # Display optimized weights
         if 'max_sharpe_weights' in st.session_state:
             st.markdown("---")
@@ -1012,6 +1324,13 @@ with tab4:
                     st.metric("Volatility", f"{perf['volatility']:.2%}")
                     st.metric("Sharpe Ratio", f"{perf['sharpe_ratio']:.3f}")
 
+                diagnostics = st.session_state.get('max_sharpe_diagnostics')
+                if diagnostics and diagnostics.get('solve_time') is not None:
+                    st.caption(
+                        f"Tangency portfolio from a single QP: {diagnostics['solver']}, "
+                        f"{diagnostics['iterations']} iterations, {diagnostics['solve_time'] * 1000:.1f} ms"
+                    )
+
             # Pie chart
             fig = px.pie(
                 weights_df,
@@ -1026,8 +1345,9 @@ with tab4:
                 current_weights = st.session_state.portfolio.get_weights()
                 current_perf = calculate_portfolio_performance(
                     current_weights,
-                    st.session_state.returns_data,
-                    risk_free_rate
+                    returns_context,
+                    risk_free_rate,
+                    cov_method
                 )
 
                 comparison = get_optimization_comparison_insights(
@@ -1074,16 +1394,198 @@ with tab4:
             )
             st.plotly_chart(fig, use_container_width=True)
 
+        if 'risk_parity_weights' in st.session_state:
+            st.markdown("---")
+            st.subheader("Risk Parity Portfolio")
+
+            col1, col2 = st.columns(2)
+
+            with col1:
+                weights_df = pd.DataFrame([
+                    {
+                        'Ticker': k,
+                        'Optimal Weight (%)': v * 100,
+                        'Risk Contribution (%)': st.session_state.risk_parity_contributions.get(k, 0) * 100
+                    }
+                    for k, v in st.session_state.risk_parity_weights.items()
+                ])
+                st.dataframe(weights_df, use_container_width=True)
+
+            with col2:
+                if 'risk_parity_performance' in st.session_state:
+                    perf = st.session_state.risk_parity_performance
+                    st.metric("Expected Return", f"{perf['expected_return']:.2%}")
+                    st.metric("Volatility", f"{perf['volatility']:.2%}")
+                    st.metric("Sharpe Ratio", f"{perf['sharpe_ratio']:.3f}")
+
+            # Pie chart
+            fig = px.pie(
+                weights_df,
+                values='Optimal Weight (%)',
+                names='Ticker',
+                title='Optimized Allocation (Risk Parity)'
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+        if 'hrp_weights' in st.session_state:
+            st.markdown("---")
+            st.subheader("Hierarchical Risk Parity Portfolio")
+
+            col1, col2 = st.columns(2)
+
+            with col1:
+                weights_df = pd.DataFrame([
+                    {'Ticker': k, 'Optimal Weight (%)': v * 100}
+                    for k, v in st.session_state.hrp_weights.items()
+                ])
+                st.dataframe(weights_df, use_container_width=True)
+
+            with col2:
+                if 'hrp_performance' in st.session_state:
+                    perf = st.session_state.hrp_performance
+                    st.metric("Expected Return", f"{perf['expected_return']:.2%}")
+                    st.metric("Volatility", f"{perf['volatility']:.2%}")
+                    st.metric("Sharpe Ratio", f"{perf['sharpe_ratio']:.3f}")
+
+            # Pie chart
+            fig = px.pie(
+                weights_df,
+                values='Optimal Weight (%)',
+                names='Ticker',
+                title='Optimized Allocation (HRP)'
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+        # Tail-risk optimization
+        st.markdown("---")
+        st.subheader("Tail-Risk Optimization (CVaR)")
+        st.caption(
+            "Minimizes the average loss in the worst outcomes, measured on bootstrapped "
+            "scenarios of historical returns instead of assuming normal returns."
+        )
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            cvar_confidence = st.selectbox("Confidence Level", [0.90, 0.95, 0.99], index=1,
+                                           format_func=lambda x: f"{x:.0%}")
+        with col2:
+            cvar_horizon = st.slider("Scenario Horizon (days)", min_value=1, max_value=63, value=21)
+        with col3:
+            cvar_cap = st.number_input(
+                "CVaR Cap (%, 0 = minimize CVaR)", min_value=0.0, max_value=100.0, value=0.0, step=0.5,
+                help="With a cap, maximizes expected return while keeping CVaR at or below it"
+            )
+
+        if st.button("Optimize CVaR"):
+            with st.spinner("Optimizing over scenarios..."):
+                scenarios = bootstrap_scenarios(returns_context, cvar_horizon, 10000, seed=42)
+                st.session_state.cvar_result = optimize_cvar(
+                    scenarios,
+                    cvar_confidence,
+                    max_cvar=cvar_cap / 100 if cvar_cap > 0 else None,
+                    return_details=True
+                )
+                st.session_state.cvar_horizon = cvar_horizon
+
+        if 'cvar_result' in st.session_state:
+            result = st.session_state.cvar_result
+            if result['weights']:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.dataframe(pd.DataFrame([
+                        {'Ticker': k, 'Optimal Weight (%)': v * 100}
+                        for k, v in result['weights'].items()
+                    ]), use_container_width=True)
+                with col2:
+                    horizon_label = f"{st.session_state.cvar_horizon}-day"
+                    st.metric(f"Expected Return ({horizon_label})", f"{result['expected_return']:.2%}")
+                    st.metric(f"VaR ({horizon_label})", f"{result['var']:.2%}")
+                    st.metric(f"CVaR ({horizon_label})", f"{result['cvar']:.2%}")
+            else:
+                st.error("No portfolio meets the CVaR cap")
+
+        # Constrained optimization
+        st.markdown("---")
+        st.subheader("Constrained Optimization")
+        st.caption(
+            "Applies position limits, sector caps, a turnover budget from your current holdings "
+            "and a maximum number of holdings. Results update as you move the sliders."
+        )
+
+        tickers = list(returns_context.tickers)
+        sector_map = get_sector_map(tickers)
+        unknown_sectors = [t for t, sector in sector_map.items() if sector == 'Unknown']
+        if unknown_sectors:
+            sector_map = get_sector_map(tickers, {t: get_stock_info(t) for t in unknown_sectors})
+        objective_labels = {'Minimum Variance': 'min_variance', 'Maximum Sharpe Ratio': 'max_sharpe'}
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            constrained_objective = objective_labels[st.selectbox("Objective", list(objective_labels.keys()))]
+            min_position = st.slider("Min Weight per Holding (%)", 0.0, 20.0, 0.0, 0.5)
+        with col2:
+            max_position = st.slider("Max Weight per Asset (%)", 5.0, 100.0, 100.0, 1.0)
+            sector_cap = st.slider("Max Weight per Sector (%)", 5.0, 100.0, 100.0, 1.0)
+        with col3:
+            max_turnover = st.slider(
+                "Max Turnover (%)", 0.0, 200.0, 200.0, 5.0,
+                help="Sum of absolute weight changes from the current portfolio (200% = unlimited)"
+            )
+            max_holdings = st.slider("Max Holdings", 1, len(tickers), len(tickers)) if len(tickers) > 1 else 1
+
+        optimizer = get_constrained_optimizer(
+            returns_context,
+            constrained_objective,
+            sectors=sector_map,
+            cov_method=cov_method,
+            risk_free_rate=risk_free_rate
+        )
+        constrained_result = optimizer.solve(
+            min_weight=min_position / 100,
+            max_weight=max_position / 100,
+            sector_caps={s: sector_cap / 100 for s in optimizer.sectors},
+            current_weights=st.session_state.portfolio.get_weights(),
+            max_turnover=max_turnover / 100 if max_turnover < 200 else None,
+            max_assets=max_holdings if max_holdings < len(tickers) else None,
+            return_details=True
+        )
+
+        if constrained_result['weights']:
+            perf = calculate_portfolio_performance(
+                constrained_result['weights'],
+                returns_context,
+                risk_free_rate,
+                cov_method
+            )
+            col1, col2 = st.columns(2)
+            with col1:
+                st.dataframe(pd.DataFrame([
+                    {'Ticker': k, 'Sector': sector_map[k], 'Optimal Weight (%)': v * 100}
+                    for k, v in constrained_result['weights'].items()
+                ]), use_container_width=True)
+            with col2:
+                st.metric("Expected Return", f"{perf['expected_return']:.2%}")
+                st.metric("Volatility", f"{perf['volatility']:.2%}")
+                st.metric("Sharpe Ratio", f"{perf['sharpe_ratio']:.3f}")
+                st.metric("Turnover", f"{constrained_result['turnover']:.1%}")
+                st.caption(
+                    f"{constrained_result['solver']}, {constrained_result['solve_time'] * 1000:.1f} ms"
+                )
+        else:
+            st.error("No portfolio satisfies these constraints; try loosening them")
+
         # Efficient Frontier
         st.markdown("---")
         st.subheader(" Efficient Frontier")
 
         if st.button("Generate Efficient Frontier"):
             with st.spinner("Generating efficient frontier..."):
-                ef_returns, ef_vols, ef_sharpes = generate_efficient_frontier(
-                    st.session_state.returns_data,
-                    n_points=50,
-                    risk_free_rate=risk_free_rate
+                # Exact corner portfolios, so a fine grid costs no extra solves
+                ef_returns, ef_vols, ef_sharpes = efficient_frontier_cla(
+                    returns_context,
+                    n_points=200,
+                    risk_free_rate=risk_free_rate,
+                    cov_method=cov_method
                 )
 
                 st.session_state.ef_returns = ef_returns
@@ -1099,7 +1601,7 @@ with tab4:
             fig.add_trace(go.Scatter(
                 x=st.session_state.ef_vols,
                 y=st.session_state.ef_returns,
-                mode='lines+markers',
+                mode='lines',
                 name='Efficient Frontier',
                 line=dict(color='blue', width=2)
             ))
@@ -1108,8 +1610,9 @@ with tab4:
             current_weights = st.session_state.portfolio.get_weights()
             current_perf = calculate_portfolio_performance(
                 current_weights,
-                st.session_state.returns_data,
-                risk_free_rate
+                returns_context,
+                risk_free_rate,
+                cov_method
             )
 
             fig.add_trace(go.Scatter(
@@ -1141,6 +1644,26 @@ with tab4:
                     marker=dict(size=12, color='orange', symbol='square')
                 ))
 
+            if 'risk_parity_performance' in st.session_state:
+                perf = st.session_state.risk_parity_performance
+                fig.add_trace(go.Scatter(
+                    x=[perf['volatility']],
+                    y=[perf['expected_return']],
+                    mode='markers',
+                    name='Risk Parity',
+                    marker=dict(size=12, color='purple', symbol='circle')
+                ))
+
+            if 'hrp_performance' in st.session_state:
+                perf = st.session_state.hrp_performance
+                fig.add_trace(go.Scatter(
+                    x=[perf['volatility']],
+                    y=[perf['expected_return']],
+                    mode='markers',
+                    name='HRP',
+                    marker=dict(size=12, color='teal', symbol='triangle-up')
+                ))
+
             fig.update_layout(
                 title="Efficient Frontier",
                 xaxis_title="Volatility (Risk)",
@@ -1164,7 +1687,7 @@ with tab5:
         # Correlation heatmap
         st.subheader("Correlation Heatmap")
 
-        corr_matrix = calculate_correlation_matrix(st.session_state.returns_data)
+        corr_matrix = calculate_correlation_matrix(returns_context)
 
         fig, ax = plt.subplots(figsize=(10, 8))
         sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0, ax=ax,
@@ -1260,7 +1783,7 @@ with tab5:
 
         weights = st.session_state.portfolio.get_weights()
 
-        div_ratio = calculate_diversification_ratio(st.session_state.returns_data, weights)
+        div_ratio = calculate_diversification_ratio(returns_context, weights)
 
         col1, col2 = st.columns(2)
 
@@ -1278,7 +1801,7 @@ with tab5:
 
         with col2:
             # Risk contribution
-            risk_contrib = calculate_contribution_to_risk(st.session_state.returns_data, weights)
+            risk_contrib = calculate_contribution_to_risk(returns_context, weights)
             if not risk_contrib.empty:
                 st.markdown("**Risk Contribution by Asset:**")
                 st.dataframe(risk_contrib, use_container_width=True)
@@ -1288,6 +1811,45 @@ with tab5:
                 max_contributor = risk_contrib.loc[max_contrib_idx]
                 st.caption(f" **{max_contributor['Ticker']}** contributes the most risk ({max_contributor['Risk Contribution (%)']:.1f}%) despite having only {max_contributor['Weight (%)']:.1f}% weight.")
 
+        st.markdown("---")
+
+        # Historical stress tests
+        st.subheader("Historical Stress Tests")
+        st.caption("Replays past market crises against today's holdings (buy-and-hold, daily data from 2007).")
+
+        if st.button("Run Stress Tests"):
+            with st.spinner("Fetching crisis-period history..."):
+                tickers = st.session_state.portfolio.get_tickers()
+                stress_data = fetch_multiple_stocks(tickers, '2007-01-01', str(datetime.now().date()), '1d')
+                stress_returns = get_returns_dataframe(stress_data, dropna=False)
+                initial_value = st.session_state.portfolio.get_total_value()
+
+                st.session_state.stress_results = run_stress_tests(stress_returns, weights, initial_value)
+                st.session_state.stress_windows = rolling_window_losses(stress_returns, weights, initial_value)
+
+        if 'stress_results' in st.session_state and not st.session_state.stress_results.empty:
+            stress_df = st.session_state.stress_results
+
+            fig = go.Figure(data=[
+                go.Bar(x=stress_df['Scenario'], y=stress_df['Return (%)'],
+                      marker_color=np.where(stress_df['Return (%)'] < 0, '#d62728', '#2ca02c'))
+            ])
+            fig.update_layout(
+                title="Portfolio Return by Scenario",
+                xaxis_title="Scenario",
+                yaxis_title="Return (%)"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(stress_df.round(2), use_container_width=True)
+
+            if (stress_df['Coverage (%)'] < 100).any():
+                st.caption("Coverage below 100% means some holdings were not yet trading; they are held flat for that scenario.")
+
+            windows_df = st.session_state.stress_windows
+            if not windows_df.empty:
+                st.markdown(f"**Worst 1-Month Windows** (out of {len(windows_df)} historical windows):")
+                st.dataframe(windows_df.head(5).round(2), use_container_width=True)
+
     else:
         st.info("Add stocks and fetch data from the Portfolio tab first")
 
@@ -1322,7 +1884,7 @@ with tab6:
         if not st.session_state.returns_data.empty:
             weights = st.session_state.portfolio.get_weights()
             stats = calculate_portfolio_stats(
-                st.session_state.returns_data,
+                returns_context,
                 weights,
                 risk_free_rate
             )
@@ -1330,10 +1892,11 @@ with tab6:
 
         simulation_data = {}
         if 'mc_stats' in st.session_state:
+            sim_params = st.session_state.get('sim_params', {})
             simulation_data = {
                 'mc_stats': st.session_state.mc_stats,
-                'horizon_days': horizon_days if 'horizon_days' in locals() else 252,
-                'n_simulations': n_simulations if 'n_simulations' in locals() else 1000
+                'horizon_days': sim_params.get('horizon_days', 252),
+                'n_simulations': sim_params.get('n_simulations', 1000)
             }
 
         optimization_data = {}
@@ -1347,7 +1910,7 @@ with tab6:
         analytics_data = {}
         if not st.session_state.returns_data.empty:
             weights = st.session_state.portfolio.get_weights()
-            div_ratio = calculate_diversification_ratio(st.session_state.returns_data, weights)
+            div_ratio = calculate_diversification_ratio(returns_context, weights)
             analytics_data['diversification_ratio'] = div_ratio
 
             # PCA
@@ -0,0 +1,162 @@
+"""
+Chart data preparation: decimate long series and pre-bin histograms before plotting
+"""
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+
+DECIMATION_METHODS = ['lttb', 'minmax']
+
+# Points per chart sent to the browser; a chart is only ~1000 pixels wide
+MAX_CHART_POINTS = 500
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the first and last points and, from each of n_out - 2 equal buckets
+    in between, the point forming the largest triangle with the previously
+    kept point and the average of the next bucket. Preserves the visual
+    shape of a line far better than taking every k-th point.
+
+    Args:
+        x: Sorted x values
+        y: y values
+        n_out: Number of points to keep
+
+    Returns:
+        Sorted indices of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    kept = np.empty(n_out, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+
+    return kept
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Min/max bucketing: keep the lowest and highest point of each bucket
+
+    Cheaper than LTTB and never hides a spike, at the cost of a slightly
+    jagged line.
+
+    Args:
+        y: y values
+        n_out: Approximate number of points to keep
+
+    Returns:
+        Sorted indices of the kept points (first and last always included)
+    """
+    n = len(y)
+    n_buckets = max(1, n_out // 2)
+    if n_out >= n:
+        return np.arange(n)
+
+    bucket_len = int(np.ceil(n / n_buckets))
+    padded = np.pad(np.asarray(y, dtype=np.float64), (0, n_buckets * bucket_len - n), mode='edge')
+    buckets = padded.reshape(n_buckets, bucket_len)
+    offsets = np.arange(n_buckets) * bucket_len
+
+    kept = np.concatenate([
+        offsets + buckets.argmin(axis=1),
+        offsets + buckets.argmax(axis=1),
+        [0, n - 1]
+    ])
+    return np.unique(np.minimum(kept, n - 1))
+
+
+def decimate_series(
+    df: pd.DataFrame,
+    x: str,
+    columns: List[str],
+    max_points: int = MAX_CHART_POINTS,
+    method: str = 'lttb'
+) -> pd.DataFrame:
+    """
+    Reduce a multi-series DataFrame to at most max_points rows
+
+    The budget is split evenly across the columns and the indices kept for
+    each are merged, so every series still shares one x grid (needed for
+    filled bands between traces).
+
+    Args:
+        df: Data with one x column and several y columns
+        x: Name of the x column
+        columns: y columns to preserve the shape of
+        max_points: Rows to keep in total
+        method: 'lttb' or 'minmax'
+
+    Returns:
+        Subset of df's rows, in order
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Unknown decimation method: {method}")
+    if len(df) <= max_points:
+        return df
+
+    per_column = max(3, max_points // max(len(columns), 1))
+    x_values = df[x].to_numpy()
+    kept = []
+    for column in columns:
+        y_values = df[column].to_numpy()
+        if method == 'lttb':
+            kept.append(lttb_indices(x_values, y_values, per_column))
+        else:
+            # Two buckets' worth is left for the first and last points
+            kept.append(minmax_indices(y_values, per_column - 2))
+
+    return df.iloc[np.unique(np.concatenate(kept))]
+
+
+def histogram_bins(
+    values: np.ndarray,
+    bins: int = 50,
+    value_range: Optional[tuple] = None
+) -> pd.DataFrame:
+    """
+    Pre-bin values so a chart receives counts instead of raw observations
+
+    Args:
+        values: Observations, e.g. terminal portfolio values
+        bins: Number of equal-width bins
+        value_range: Optional (low, high) range of the bins
+
+    Returns:
+        DataFrame with 'Left', 'Right', 'Center', 'Width' and 'Count' per bin
+    """
+    values = np.asarray(values)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins, range=value_range)
+
+    return pd.DataFrame({
+        'Left': edges[:-1],
+        'Right': edges[1:],
+        'Center': (edges[:-1] + edges[1:]) / 2,
+        'Width': np.diff(edges),
+        'Count': counts
+    })
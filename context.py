@@ -0,0 +1,280 @@
+"""
+Shared returns statistics: one memoized context per returns matrix
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple, Optional, Union, Callable, Any
+
+
+# Returns matrices whose contexts are kept in memory (least recently used dropped first)
+MAX_CONTEXTS = 8
+
+
+def fingerprint_returns(returns: pd.DataFrame) -> str:
+    """
+    Content hash of a returns DataFrame (values, tickers and every date)
+
+    Args:
+        returns: Historical returns DataFrame
+
+    Returns:
+        Hex digest identifying the returns matrix
+    """
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(returns.to_numpy(dtype=np.float64)).tobytes())
+    h.update(repr(list(returns.columns)).encode())
+    h.update(repr(returns.shape).encode())
+    h.update(repr(returns.index.dtype).encode())
+    h.update(pd.util.hash_pandas_object(returns.index).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class ReturnsContext:
+    """
+    Lazily computed, cached statistics of one returns matrix
+
+    Each statistic (aligned matrix, means, covariance, Cholesky factor,
+    correlation) is computed on first use and reused afterwards. Subsets of
+    tickers share the parent's statistics: pairwise covariances do not
+    depend on the other columns, so a subset's covariance is a slice of the
+    full one.
+    """
+
+    def __init__(self, returns: pd.DataFrame, fingerprint: Optional[str] = None):
+        """
+        Initialize a context
+
+        Args:
+            returns: Historical returns DataFrame
+            fingerprint: Precomputed fingerprint_returns(returns), if known
+        """
+        self.returns = returns
+        self.fingerprint = fingerprint if fingerprint is not None else fingerprint_returns(returns)
+        self._cache: Dict[str, Any] = {}
+        self._subsets: Dict[Tuple[str, ...], 'ReturnsContext'] = {}
+        self._parent: Optional[Tuple['ReturnsContext', np.ndarray]] = None
+
+    def cached(self, name: str, compute: Callable[[], Any]) -> Any:
+        """
+        Return a cached statistic, computing it on first use
+
+        Other modules use this to attach their own derived statistics (e.g.
+        shrinkage covariances) to the context. Cached arrays are read-only.
+
+        Args:
+            name: Cache key, unique per statistic and parameters
+            compute: Zero-argument function producing the statistic
+
+        Returns:
+            The cached value
+        """
+        if name not in self._cache:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self._cache[name] = value
+        return self._cache[name]
+
+    @property
+    def tickers(self) -> List[str]:
+        """Column names of the returns matrix"""
+        return list(self.returns.columns)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Returns as a contiguous float64 array (days x assets)"""
+        return self.cached('matrix', lambda: np.ascontiguousarray(self.returns.to_numpy(dtype=np.float64)))
+
+    @property
+    def has_missing(self) -> bool:
+        """Whether any return is NaN"""
+        return self.cached('has_missing', lambda: bool(np.isnan(self.matrix).any()))
+
+    @property
+    def mean(self) -> np.ndarray:
+        """Daily mean return per asset"""
+        if self._parent is not None:
+            parent, idx = self._parent
+            return self.cached('mean', lambda: parent.mean[idx])
+        return self.cached('mean', lambda: np.nanmean(self.matrix, axis=0))
+
+    @property
+    def cov(self) -> np.ndarray:
+        """Daily covariance matrix (pairwise complete observations, as pandas)"""
+        if self._parent is not None:
+            parent, idx = self._parent
+            return self.cached('cov', lambda: parent.cov[np.ix_(idx, idx)])
+
+        def compute():
+            if self.has_missing:
+                return self.returns.cov().values
+            return np.atleast_2d(np.cov(self.matrix, rowvar=False))
+
+        return self.cached('cov', compute)
+
+    @property
+    def std(self) -> np.ndarray:
+        """Daily volatility per asset"""
+        return self.cached('std', lambda: np.sqrt(np.diag(self.cov)))
+
+    @property
+    def annual_mean(self) -> np.ndarray:
+        """Annualized mean return per asset (252 trading days)"""
+        return self.cached('annual_mean', lambda: self.mean * 252)
+
+    @property
+    def annual_cov(self) -> np.ndarray:
+        """Annualized covariance matrix (252 trading days)"""
+        return self.cached('annual_cov', lambda: self.cov * 252)
+
+    @property
+    def cholesky(self) -> np.ndarray:
+        """
+        Lower Cholesky factor of the daily covariance
+
+        A singular covariance (more assets than days, duplicated series) gets
+        a small ridge on the diagonal so the factor always exists.
+        """
+        def compute():
+            try:
+                return np.linalg.cholesky(self.cov)
+            except np.linalg.LinAlgError:
+                ridge = 1e-10 * max(np.trace(self.cov) / len(self.cov), 1e-12)
+                return np.linalg.cholesky(self.cov + ridge * np.eye(len(self.cov)))
+
+        return self.cached('cholesky', compute)
+
+    @property
+    def corr(self) -> pd.DataFrame:
+        """Correlation matrix DataFrame (a copy; the cached matrix is shared)"""
+        return self._corr.copy()
+
+    @property
+    def _corr(self) -> pd.DataFrame:
+        """Cached correlation matrix, not to be modified"""
+        def compute():
+            if self._parent is not None:
+                parent, idx = self._parent
+                return parent._corr.iloc[idx, idx]
+            if self.has_missing:
+                # Pairwise correlations use each pair's own standard deviations
+                return self.returns.corr()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = self.cov / np.outer(self.std, self.std)
+            return pd.DataFrame(values, index=self.returns.columns, columns=self.returns.columns)
+
+        return self.cached('corr', compute)
+
+    def subset(self, tickers: List[str]) -> 'ReturnsContext':
+        """
+        Context for a subset of columns, sharing this context's statistics
+
+        Args:
+            tickers: Columns to keep, in the order wanted
+
+        Returns:
+            ReturnsContext (self when the columns are unchanged)
+        """
+        key = tuple(tickers)
+        if list(key) == self.tickers:
+            return self
+
+        if key not in self._subsets:
+            child = ReturnsContext(
+                self.returns[list(key)],
+                hashlib.sha256((self.fingerprint + repr(key)).encode()).hexdigest()
+            )
+            child._parent = (self, self.returns.columns.get_indexer(list(key)))
+            self._subsets[key] = child
+        return self._subsets[key]
+
+    def align(self, weights: Dict[str, float]) -> Tuple[Optional['ReturnsContext'], np.ndarray]:
+        """
+        Subset context for the weighted tickers that have returns
+
+        Args:
+            weights: Portfolio weights
+
+        Returns:
+            Tuple of (subset context or None if no ticker has returns,
+            weights normalized to sum to one)
+        """
+        tickers = [t for t in weights.keys() if t in self.returns.columns]
+        if not tickers:
+            return None, np.array([])
+
+        weights_array = np.array([weights[t] for t in tickers])
+        return self.subset(tickers), weights_array / weights_array.sum()
+
+    def portfolio_returns(self, weights_array: np.ndarray) -> np.ndarray:
+        """
+        Daily returns of a weighted portfolio of this context's columns
+
+        Missing returns count as zero for that day, as with a pandas
+        weighted sum.
+
+        Args:
+            weights_array: Weight per column
+
+        Returns:
+            Array of portfolio returns
+        """
+        matrix = np.nan_to_num(self.matrix) if self.has_missing else self.matrix
+        return matrix @ weights_array
+
+
+ReturnsLike = Union[pd.DataFrame, ReturnsContext]
+
+_contexts: 'OrderedDict[str, ReturnsContext]' = OrderedDict()
+_contexts_lock = threading.Lock()
+
+def get_returns_context(returns: ReturnsLike, fingerprint: Optional[str] = None) -> ReturnsContext:
+    """
+    Shared context for a returns matrix
+
+    Contexts are keyed on the matrix fingerprint, so every caller holding
+    the same data (even a different DataFrame object, e.g. after a
+    Streamlit rerun) reuses the same cached statistics. A DataFrame is
+    hashed on every call; callers that look up the same data repeatedly
+    should pass the context around instead, or the fingerprint if they
+    already have it.
+
+    Args:
+        returns: Historical returns DataFrame, or an existing context
+        fingerprint: Precomputed fingerprint_returns(returns), if known
+
+    Returns:
+        ReturnsContext
+    """
+    if isinstance(returns, ReturnsContext):
+        return returns
+
+    if fingerprint is None:
+        fingerprint = fingerprint_returns(returns)
+    with _contexts_lock:
+        context = _contexts.get(fingerprint)
+        if context is not None:
+            _contexts.move_to_end(fingerprint)
+            return context
+
+        context = ReturnsContext(returns, fingerprint)
+        _contexts[fingerprint] = context
+        while len(_contexts) > MAX_CONTEXTS:
+            _contexts.popitem(last=False)
+        return context
+
+
+def as_dataframe(returns: ReturnsLike) -> pd.DataFrame:
+    """
+    Returns DataFrame behind a context (or the DataFrame itself)
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+
+    Returns:
+        Historical returns DataFrame
+    """
+    return returns.returns if isinstance(returns, ReturnsContext) else returns
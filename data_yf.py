@@ -268,12 +268,41 @@ def get_stock_info(ticker: str) -> Dict:
         }
 
 
-def get_returns_dataframe(data_dict: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+def get_sector_map(tickers: List[str], stock_info: Optional[Dict[str, Dict]] = None) -> Dict[str, str]:
+    """
+    Sector of each ticker, for sector constraints and exposure reports
+
+    Metadata from get_stock_info takes precedence; tickers without a known
+    sector fall back to the popular stocks database, then to 'Unknown'.
+
+    Args:
+        tickers: Stock symbols
+        stock_info: Optional dictionary mapping ticker to get_stock_info output
+
+    Returns:
+        Dictionary mapping ticker to sector
+    """
+    stock_info = stock_info or {}
+    sectors = {}
+
+    for ticker in tickers:
+        sector = stock_info.get(ticker, {}).get('sector', 'N/A')
+        if sector in ('N/A', None, ''):
+            sector = POPULAR_STOCKS.get(ticker, {}).get('sector', 'Unknown')
+        sectors[ticker] = sector
+
+    return sectors
+
+
+def get_returns_dataframe(data_dict: Dict[str, pd.DataFrame], dropna: bool = True) -> pd.DataFrame:
     """
     Convert price data to returns DataFrame
 
     Args:
         data_dict: Dictionary mapping ticker to price DataFrame
+        dropna: Drop every date on which any ticker lacks a return. When False,
+            only dates with no returns at all are dropped, so a ticker with a
+            short history does not truncate the others (used by stress tests)
 
     Returns:
         DataFrame with returns for each ticker
@@ -288,8 +317,10 @@ def get_returns_dataframe(data_dict: Dict[str, pd.DataFrame]) -> pd.DataFrame:
         return pd.DataFrame()
 
     # Calculate daily returns
-    returns = prices.pct_change().dropna()
-    return returns
+    if dropna:
+        return prices.pct_change().dropna()
+
+    return prices.pct_change(fill_method=None).dropna(how='all')
 
 
 def get_last_refresh_time() -> str:
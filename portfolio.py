@@ -6,6 +6,8 @@ import pandas as pd
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 
+from context import ReturnsLike, get_returns_context
+
 
 class Portfolio:
     """Portfolio management class"""
@@ -117,20 +119,20 @@ class Portfolio:
         return list(self.holdings.keys())
 
 
-def calculate_portfolio_stats(returns: pd.DataFrame, weights: Dict[str, float],
+def calculate_portfolio_stats(returns: ReturnsLike, weights: Dict[str, float],
                               risk_free_rate: float = 0.02) -> Dict[str, float]:
     """
     Calculate portfolio statistics
 
     Args:
-        returns: DataFrame with daily returns for each asset
+        returns: DataFrame with daily returns for each asset, or a ReturnsContext
         weights: Dictionary mapping ticker to weight
         risk_free_rate: Annual risk-free rate
 
     Returns:
         Dictionary with portfolio metrics
     """
-    if returns.empty or not weights:
+    if not weights or get_returns_context(returns).returns.empty:
         return {
             'annual_return': 0,
             'annual_volatility': 0,
@@ -139,10 +141,9 @@ def calculate_portfolio_stats(returns: pd.DataFrame, weights: Dict[str, float],
         }
 
     # Align returns with weights
-    tickers = list(weights.keys())
-    available_tickers = [t for t in tickers if t in returns.columns]
+    context, weights_array = get_returns_context(returns).align(weights)
 
-    if not available_tickers:
+    if context is None:
         return {
             'annual_return': 0,
             'annual_volatility': 0,
@@ -150,24 +151,19 @@ def calculate_portfolio_stats(returns: pd.DataFrame, weights: Dict[str, float],
             'total_return': 0
         }
 
-    # Filter returns and normalize weights
-    returns_subset = returns[available_tickers]
-    weights_array = np.array([weights[t] for t in available_tickers])
-    weights_array = weights_array / weights_array.sum()  # Normalize
-
     # Calculate portfolio returns
-    portfolio_returns = (returns_subset * weights_array).sum(axis=1)
+    portfolio_returns = context.portfolio_returns(weights_array)
 
     # Annual metrics (assuming 252 trading days)
     annual_return = portfolio_returns.mean() * 252
-    annual_volatility = portfolio_returns.std() * np.sqrt(252)
+    annual_volatility = portfolio_returns.std(ddof=1) * np.sqrt(252)
 
     # Sharpe ratio
     excess_return = annual_return - risk_free_rate
     sharpe_ratio = excess_return / annual_volatility if annual_volatility > 0 else 0
 
     # Total return
-    total_return = (1 + portfolio_returns).cumprod().iloc[-1] - 1 if len(portfolio_returns) > 0 else 0
+    total_return = np.prod(1 + portfolio_returns) - 1 if len(portfolio_returns) > 0 else 0
 
     return {
         'annual_return': annual_return,
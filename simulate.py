@@ -1,26 +1,98 @@
 """
-Portfolio simulation: Monte Carlo (GBM) and Historical Bootstrap
+Portfolio simulation: Monte Carlo (GBM, Student-t, GARCH, regime switching) and Historical Bootstrap
 """
+import hashlib
+import inspect
+import os
+import sys
+import threading
+import time
+import warnings
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
-from typing import Dict, Tuple, Optional
+from scipy.optimize import minimize
+from scipy.signal import lfilter
+from scipy.stats import norm, qmc, t as student_t
+from typing import Dict, Tuple, Optional, List, Callable, Any
+
+from context import ReturnsLike, get_returns_context
+
+
+VARIANCE_REDUCTION_METHODS = ['none', 'antithetic', 'control_variate', 'sobol']
+
+# Independent scrambles used to estimate the error of Sobol (randomized QMC) runs
+SOBOL_REPLICATES = 8
+
+# Batches needed before monte_carlo_adaptive trusts its error estimate
+MIN_ADAPTIVE_BATCHES = 4
+
+BOOTSTRAP_METHODS = ['stationary', 'block', 'iid']
+
+# Default confidence levels for VaR / CVaR in simulation statistics
+TAIL_LEVELS = [0.95, 0.99]
+
+# Trading days between scheduled rebalances (threshold rebalancing is checked daily)
+REBALANCE_FREQUENCIES = {'none': None, 'monthly': 21, 'quarterly': 63, 'annually': 252, 'threshold': None}
+
+# Floating-point precision of simulated paths
+PRECISIONS = {'float64': np.float64, 'float32': np.float32}
+
+# Days summed per block when accumulating log returns; bounds float32 drift
+LOG_SUM_BLOCK = 64
+
+# Memory budget for one block of days read from an on-disk path store
+STORE_BLOCK_BYTES = 64 * 1024 * 1024
+
+# Regime labels and the rolling-volatility quantiles that separate them
+REGIME_NAMES = {2: ['calm', 'stressed'], 3: ['calm', 'stressed', 'crisis']}
+REGIME_QUANTILES = {2: [0.75], 3: [0.6, 0.9]}
+
+
+def make_rng(
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None
+) -> np.random.Generator:
+    """
+    Get a random generator local to one simulation call
+
+    Simulations never touch NumPy's global random state, so concurrent
+    Streamlit sessions cannot interleave each other's draws.
+
+    Args:
+        seed: Random seed for reproducibility
+        rng: Existing generator to use as-is
+
+    Returns:
+        NumPy Generator (PCG64 unless an explicit generator is passed)
+    """
+    if rng is not None:
+        return rng
+    return np.random.Generator(np.random.PCG64(seed))
 
 
 def monte_carlo_gbm(
-    returns: pd.DataFrame,
+    returns: ReturnsLike,
     weights: Dict[str, float],
     initial_value: float,
     horizon_days: int,
     n_simulations: int = 1000,
     return_tilt: float = 0.0,
     volatility_tilt: float = 1.0,
-    seed: Optional[int] = None
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    variance_reduction: str = 'none',
+    precision: str = 'float64',
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None,
+    chunk_size: Optional[int] = None,
+    return_paths: bool = True
 ) -> Tuple[np.ndarray, Dict[str, float]]:
     """
     Monte Carlo simulation using Geometric Brownian Motion
 
     Args:
-        returns: Historical returns DataFrame
+        returns: Historical returns DataFrame or ReturnsContext
         weights: Portfolio weights
         initial_value: Starting portfolio value
         horizon_days: Simulation horizon in days
@@ -28,155 +100,1987 @@ def monte_carlo_gbm(
         return_tilt: Adjustment to expected return (additive)
         volatility_tilt: Adjustment to volatility (multiplicative)
         seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        variance_reduction: 'none', 'antithetic', 'control_variate' or 'sobol'
+        precision: 'float64' or 'float32' (half the memory, for display bands)
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value for the probability of reaching it
+        chunk_size: Simulate this many paths at a time, bounding the memory
+            used for shocks and intermediate arrays. Each chunk is an
+            independent randomization; statistics are accumulated as chunks
+            are produced.
+        return_paths: Keep the full path matrix. With False only a few
+            values per path are retained for the statistics, so peak memory
+            is bounded by chunk_size; to keep the paths of a run too large
+            for memory, use simulate_to_store instead.
 
     Returns:
-        Tuple of (simulated paths array, statistics dict)
+        Tuple of (simulated paths array, empty when return_paths is False,
+        and statistics dict). The statistics include 'std_error', the
+        standard error of the expected value, and the tail-risk metrics
+        described in _tail_stats.
     """
-    if seed is not None:
-        np.random.seed(seed)
+    if variance_reduction not in VARIANCE_REDUCTION_METHODS:
+        raise ValueError(f"Unknown variance reduction method: {variance_reduction}")
+    dtype = _resolve_dtype(precision)
 
-    # Align returns with weights
-    tickers = list(weights.keys())
-    available_tickers = [t for t in tickers if t in returns.columns]
+    rng = make_rng(seed, rng)
 
-    if not available_tickers:
-        return np.zeros((n_simulations, horizon_days + 1)), {}
+    params = _gbm_parameters(returns, weights, return_tilt, volatility_tilt)
+    if params is None:
+        return np.zeros((n_simulations if return_paths else 0, horizon_days + 1)), {}
+    mu, sigma = params
 
-    returns_subset = returns[available_tickers]
-    weights_array = np.array([weights[t] for t in available_tickers])
-    weights_array = weights_array / weights_array.sum()
+    chunk_size = n_simulations if not chunk_size else min(chunk_size, n_simulations)
+    paths = np.empty((n_simulations if return_paths else 0, horizon_days + 1), dtype=dtype)
+    accumulator = _RiskAccumulator()
 
-    # Calculate portfolio parameters
-    portfolio_returns = (returns_subset * weights_array).sum(axis=1)
+    for start in range(0, n_simulations, chunk_size):
+        stop = min(start + chunk_size, n_simulations)
+        chunk, path_weights, batch_ids, control = _gbm_batch(
+            rng, mu, sigma, initial_value, horizon_days, stop - start, variance_reduction, dtype
+        )
+        terminal_values = chunk[:, -1].astype(np.float64)
+        accumulator.add(
+            chunk,
+            path_weights,
+            _mean_standard_error(terminal_values, variance_reduction, batch_ids, control)
+        )
+        if return_paths:
+            paths[start:stop] = chunk
 
-    mu = portfolio_returns.mean() + (return_tilt / 252)  # Daily return with tilt
-    sigma = portfolio_returns.std() * volatility_tilt    # Daily volatility with tilt
+    # Calculate statistics
+    stats = accumulator.stats(initial_value, var_levels, target_value)
 
-    # Generate simulations
-    dt = 1  # Daily steps
-    paths = np.zeros((n_simulations, horizon_days + 1))
-    paths[:, 0] = initial_value
+    return paths, stats
+
+
+def monte_carlo_adaptive(
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    initial_value: float,
+    horizon_days: int,
+    target_precision: float = 0.005,
+    percentiles: List[float] = [10, 50],
+    return_tilt: float = 0.0,
+    volatility_tilt: float = 1.0,
+    batch_size: int = 500,
+    max_simulations: int = 50000,
+    time_budget: float = 5.0,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    variance_reduction: str = 'sobol',
+    precision: str = 'float64',
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None
+) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    GBM Monte Carlo that adds batches until the requested percentiles converge
 
-    for t in range(1, horizon_days + 1):
-        # Generate random shocks
-        Z = np.random.standard_normal(n_simulations)
+    Each batch is an independent randomization, so the spread of per-batch
+    percentiles gives their standard error whatever the sampling scheme.
+    Simulation stops once every confidence half-width is within
+    target_precision of its percentile, or when max_simulations or
+    time_budget is reached.
 
-        # GBM formula: S(t) = S(t-1) * exp((mu - 0.5*sigma^2)*dt + sigma*sqrt(dt)*Z)
-        paths[:, t] = paths[:, t-1] * np.exp((mu - 0.5 * sigma**2) * dt + sigma * np.sqrt(dt) * Z)
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        horizon_days: Simulation horizon in days
+        target_precision: Relative confidence half-width (0.005 = +/-0.5%)
+        percentiles: Percentiles of the terminal value that must converge
+        return_tilt: Adjustment to expected return (additive)
+        volatility_tilt: Adjustment to volatility (multiplicative)
+        batch_size: Paths per batch
+        max_simulations: Upper limit on the total number of paths
+        time_budget: Wall-clock budget in seconds
+        confidence: Confidence level of the interval
+        seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        variance_reduction: Sampling scheme used within each batch
+        precision: 'float64' or 'float32'
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value for the probability of reaching it
 
-    # Calculate statistics
-    terminal_values = paths[:, -1]
-    stats = {
-        'mean': np.mean(terminal_values),
-        'median': np.median(terminal_values),
-        'std': np.std(terminal_values),
-        'p10': np.percentile(terminal_values, 10),
-        'p25': np.percentile(terminal_values, 25),
-        'p50': np.percentile(terminal_values, 50),
-        'p75': np.percentile(terminal_values, 75),
-        'p90': np.percentile(terminal_values, 90),
-        'min': np.min(terminal_values),
-        'max': np.max(terminal_values)
-    }
+    Returns:
+        Tuple of (simulated paths array, statistics dict). Besides the usual
+        statistics, the dict holds 'n_simulations', 'converged',
+        'elapsed_seconds' and the achieved relative half-width per percentile
+        (e.g. 'p10_precision').
+    """
+    if variance_reduction not in VARIANCE_REDUCTION_METHODS:
+        raise ValueError(f"Unknown variance reduction method: {variance_reduction}")
+    dtype = _resolve_dtype(precision)
+
+    rng = make_rng(seed, rng)
+
+    params = _gbm_parameters(returns, weights, return_tilt, volatility_tilt)
+    if params is None:
+        return np.zeros((0, horizon_days + 1), dtype=dtype), {}
+    mu, sigma = params
+
+    z = norm.ppf(0.5 + confidence / 2)
+    start = time.perf_counter()
+
+    batch_paths = []
+    batch_quantiles = []
+    batch_means = []
+    accumulator = _RiskAccumulator()
+    n_total = 0
+    converged = False
+    achieved = {p: np.inf for p in percentiles}
+
+    while True:
+        n_batch = min(batch_size, max_simulations - n_total)
+        paths, path_weights, _, _ = _gbm_batch(
+            rng, mu, sigma, initial_value, horizon_days, n_batch, variance_reduction, dtype
+        )
+        terminal_values = paths[:, -1].astype(np.float64)
+        if path_weights is None:
+            path_weights = np.full(n_batch, 1.0 / n_batch)
+
+        batch_paths.append(paths)
+        accumulator.add(paths, path_weights)
+        batch_quantiles.append([_weighted_percentile(terminal_values, path_weights, p) for p in percentiles])
+        batch_means.append(np.sum(path_weights * terminal_values))
+        n_total += n_batch
+
+        n_batches = len(batch_paths)
+        if n_batches >= MIN_ADAPTIVE_BATCHES:
+            quantiles = np.array(batch_quantiles)
+            half_widths = z * quantiles.std(axis=0, ddof=1) / np.sqrt(n_batches)
+            centers = np.abs(quantiles.mean(axis=0))
+            achieved = {
+                p: (half_widths[i] / centers[i] if centers[i] > 0 else np.inf)
+                for i, p in enumerate(percentiles)
+            }
+            converged = all(v <= target_precision for v in achieved.values())
+
+        elapsed = time.perf_counter() - start
+        if converged or n_total >= max_simulations or elapsed >= time_budget:
+            break
+
+    paths = np.concatenate(batch_paths)
+
+    stats = accumulator.stats(initial_value, var_levels, target_value)
+    stats['std_error'] = (
+        np.std(batch_means, ddof=1) / np.sqrt(len(batch_means)) if len(batch_means) > 1 else 0.0
+    )
+    stats['n_simulations'] = n_total
+    stats['converged'] = converged
+    stats['elapsed_seconds'] = time.perf_counter() - start
+    for p in percentiles:
+        stats[f'p{p}_precision'] = achieved[p]
 
     return paths, stats
 
 
+def monte_carlo_sweep(
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    initial_value: float,
+    return_tilts: List[float],
+    volatility_tilts: List[float],
+    horizons: List[int],
+    n_simulations: int = 10000,
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    variance_reduction: str = 'none',
+    precision: str = 'float64',
+    var_level: float = 0.95
+) -> pd.DataFrame:
+    """
+    GBM terminal-value statistics over a grid of tilts and horizons
+
+    Every grid cell reuses the same shocks (common random numbers). Under GBM
+    the log terminal value is h * (mu - sigma^2 / 2) + sigma * W_h, where W_h
+    is the sum of the first h shocks, so one draw of W_h per horizon serves
+    every return and volatility tilt. Because the value is increasing in W_h,
+    percentiles and tail sets are read off W_h sorted once per horizon;
+    only the mean needs a pass per (volatility tilt, horizon). Differences
+    between cells are therefore pure parameter effects, not sampling noise.
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        return_tilts: Adjustments to expected return (additive, annual)
+        volatility_tilts: Adjustments to volatility (multiplicative, positive)
+        horizons: Horizons in days
+        n_simulations: Number of simulation paths
+        seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        variance_reduction: 'none', 'antithetic' or 'sobol'
+        precision: 'float64' or 'float32' (shock storage; sums are float64)
+        var_level: Confidence level for VaR / CVaR
+
+    Returns:
+        DataFrame with one row per (return_tilt, volatility_tilt, horizon_days)
+        and columns 'mean', 'p10', 'p50', 'p90', 'prob_loss', 'var' and
+        'cvar' (VaR / CVaR at var_level, in currency as in _tail_stats)
+    """
+    if variance_reduction not in ('none', 'antithetic', 'sobol'):
+        raise ValueError(f"Variance reduction not supported in sweeps: {variance_reduction}")
+    if min(volatility_tilts) <= 0:
+        raise ValueError("Volatility tilts must be positive")
+    dtype = _resolve_dtype(precision)
+    rng = make_rng(seed, rng)
+
+    params = _gbm_parameters(returns, weights)
+    if params is None:
+        return pd.DataFrame()
+    mu, sigma = params
+
+    # Shock sums at each horizon: segment sums between sorted horizons, then cumulated
+    sorted_horizons = np.unique(np.asarray(horizons, dtype=int))
+    Z, _ = _gbm_shocks(rng, n_simulations, int(sorted_horizons[-1]), variance_reduction, dtype)
+    starts = np.concatenate([[0], sorted_horizons[:-1]])
+    W = np.cumsum(np.add.reduceat(Z, starts, axis=1, dtype=np.float64), axis=1)
+    del Z
+
+    n = n_simulations
+    positions = np.array([10, 50, 90, (1 - var_level) * 100]) / 100 * (n - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, n - 1)
+    fraction = positions - lower
+    # Losses at or beyond VaR come from the lowest terminal values only
+    n_tail = min(n, upper[-1] + 1)
+
+    rows = []
+    for j, h in enumerate(sorted_horizons):
+        w_sorted = np.sort(W[:, j])
+        for vt in volatility_tilts:
+            s = sigma * vt
+            # mean(exp(s * W)), shifted by the max to avoid overflow
+            shift = s * w_sorted[-1]
+            mean_growth = np.mean(np.exp(s * w_sorted - shift))
+            for rt in return_tilts:
+                log_drift = h * (mu + rt / 252 - 0.5 * s**2)
+                order_values = initial_value * np.exp(log_drift + s * w_sorted[np.concatenate([lower, upper])])
+                low_values, high_values = order_values[:len(lower)], order_values[len(lower):]
+                quantiles = low_values + (high_values - low_values) * fraction
+
+                var = initial_value - quantiles[3]
+                tail_losses = initial_value - initial_value * np.exp(log_drift + s * w_sorted[:n_tail])
+                tail_losses = tail_losses[tail_losses >= var]
+
+                # Terminal value below the initial value <=> W below this threshold
+                loss_threshold = -log_drift / s
+                rows.append({
+                    'return_tilt': rt,
+                    'volatility_tilt': vt,
+                    'horizon_days': int(h),
+                    'mean': initial_value * np.exp(log_drift + shift) * mean_growth,
+                    'p10': quantiles[0],
+                    'p50': quantiles[1],
+                    'p90': quantiles[2],
+                    'prob_loss': np.searchsorted(w_sorted, loss_threshold, side='left') / n,
+                    'var': var,
+                    'cvar': tail_losses.mean() if len(tail_losses) > 0 else var
+                })
+
+    return pd.DataFrame(rows)
+
+
 def historical_bootstrap(
-    returns: pd.DataFrame,
+    returns: ReturnsLike,
     weights: Dict[str, float],
     initial_value: float,
     horizon_days: int,
     n_simulations: int = 1000,
-    block_size: int = 1,
-    seed: Optional[int] = None
+    block_size: int = 20,
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    precision: str = 'float64',
+    method: str = 'stationary',
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None
 ) -> Tuple[np.ndarray, Dict[str, float]]:
     """
     Historical bootstrap simulation by resampling actual returns
 
+    The default stationary bootstrap (Politis & Romano) resamples blocks of
+    geometric length starting anywhere in the history, which preserves
+    volatility clustering without the fixed-block boundary effects.
+
     Args:
-        returns: Historical returns DataFrame
+        returns: Historical returns DataFrame or ReturnsContext
         weights: Portfolio weights
         initial_value: Starting portfolio value
         horizon_days: Simulation horizon in days
         n_simulations: Number of simulation paths
-        block_size: Size of blocks for block bootstrap (1 = simple bootstrap)
+        block_size: Block length for 'block', mean block length for
+            'stationary' (1 = simple bootstrap)
         seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        precision: 'float64' or 'float32' (half the memory, for display bands)
+        method: 'stationary', 'block' or 'iid'
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value for the probability of reaching it
 
     Returns:
         Tuple of (simulated paths array, statistics dict)
     """
-    if seed is not None:
-        np.random.seed(seed)
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    dtype = _resolve_dtype(precision)
+    rng = make_rng(seed, rng)
 
-    # Align returns with weights
-    tickers = list(weights.keys())
-    available_tickers = [t for t in tickers if t in returns.columns]
+    portfolio_returns = _portfolio_returns(returns, weights)
+    if portfolio_returns is None:
+        return np.zeros((n_simulations, horizon_days + 1)), {}
+
+    # Resample days for all paths at once
+    log_returns = np.log1p(portfolio_returns).astype(dtype)
+    idx = _bootstrap_indices(rng, len(log_returns), n_simulations, horizon_days, method, block_size)
+
+    # Build paths by compounding in log space
+    paths = _compound_log_returns(initial_value, log_returns[idx], dtype)
+
+    # Calculate statistics
+    stats = _summarize_paths(paths, initial_value, var_levels, target_value)
+
+    return paths, stats
+
+
+def bootstrap_scenarios(
+    returns: ReturnsLike,
+    horizon_days: int = 21,
+    n_scenarios: int = 10000,
+    block_size: int = 20,
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    method: str = 'stationary',
+    precision: str = 'float64'
+) -> pd.DataFrame:
+    """
+    Per-asset horizon returns resampled from history, for scenario-based optimization
+
+    Uses the same day indices as historical_bootstrap, but keeps every asset
+    separately instead of collapsing to one portfolio path, so the result
+    can feed optimize_cvar.
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        horizon_days: Days compounded into each scenario
+        n_scenarios: Number of scenarios
+        block_size: Block length for 'block', mean block length for
+            'stationary' (1 = simple bootstrap)
+        seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        method: 'stationary', 'block' or 'iid'
+        precision: 'float64' or 'float32'
+
+    Returns:
+        DataFrame of simple returns (scenarios x tickers)
+    """
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    dtype = _resolve_dtype(precision)
+    rng = make_rng(seed, rng)
+
+    context = get_returns_context(returns)
+    log_returns = np.log1p(np.nan_to_num(context.matrix)).astype(dtype)
+    idx = _bootstrap_indices(rng, len(log_returns), n_scenarios, horizon_days, method, block_size)
+
+    # Accumulate one day at a time: never holds a scenarios x days x assets array
+    total = np.zeros((n_scenarios, log_returns.shape[1]), dtype=dtype)
+    for t in range(horizon_days):
+        total += log_returns[idx[:, t]]
+
+    return pd.DataFrame(np.expm1(total), columns=context.tickers)
+
+
+def monte_carlo_student_t(
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    initial_value: float,
+    horizon_days: int,
+    n_simulations: int = 1000,
+    return_tilt: float = 0.0,
+    volatility_tilt: float = 1.0,
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    precision: str = 'float32',
+    df: Optional[float] = None,
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None
+) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    Monte Carlo simulation with fat-tailed Student-t shocks
+
+    Same drift and volatility as monte_carlo_gbm, but daily shocks follow a
+    unit-variance Student-t distribution whose degrees of freedom are fitted
+    to the portfolio's historical returns.
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        horizon_days: Simulation horizon in days
+        n_simulations: Number of simulation paths
+        return_tilt: Adjustment to expected return (additive)
+        volatility_tilt: Adjustment to volatility (multiplicative)
+        seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        precision: 'float32' (default) or 'float64'
+        df: Degrees of freedom (fitted by maximum likelihood if None)
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value for the probability of reaching it
+
+    Returns:
+        Tuple of (simulated paths array, statistics dict). The statistics
+        include the degrees of freedom used as 'df'.
+    """
+    dtype = _resolve_dtype(precision)
+    rng = make_rng(seed, rng)
 
-    if not available_tickers:
+    portfolio_returns = _portfolio_returns(returns, weights)
+    if portfolio_returns is None:
         return np.zeros((n_simulations, horizon_days + 1)), {}
 
-    returns_subset = returns[available_tickers]
-    weights_array = np.array([weights[t] for t in available_tickers])
-    weights_array = weights_array / weights_array.sum()
+    mu = portfolio_returns.mean() + (return_tilt / 252)
+    sigma = portfolio_returns.std(ddof=1) * volatility_tilt
+    if df is None:
+        df = fit_student_t_df(portfolio_returns)
 
-    # Calculate portfolio returns
-    portfolio_returns = (returns_subset * weights_array).sum(axis=1).values
+    # Scale the shocks in place into log increments
+    log_increments = _student_t_shocks(rng, df, (n_simulations, horizon_days), dtype)
+    log_increments *= dtype(sigma)
+    log_increments += dtype(mu - 0.5 * sigma**2)
+    paths = _compound_log_returns(initial_value, log_increments, dtype)
 
-    # Generate simulations
-    paths = np.zeros((n_simulations, horizon_days + 1))
+    stats = _summarize_paths(paths, initial_value, var_levels, target_value)
+    stats['df'] = df
+
+    return paths, stats
+
+
+def monte_carlo_garch(
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    initial_value: float,
+    horizon_days: int,
+    n_simulations: int = 1000,
+    return_tilt: float = 0.0,
+    volatility_tilt: float = 1.0,
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    precision: str = 'float32',
+    innovations: str = 'normal',
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None
+) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    Monte Carlo simulation with GARCH(1,1) volatility
+
+    Daily variance follows sigma2[t] = omega + alpha * e[t-1]^2 + beta * sigma2[t-1],
+    fitted to the portfolio's historical returns and started from today's
+    conditional variance. The recursion runs over days, vectorized across
+    all paths.
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        horizon_days: Simulation horizon in days
+        n_simulations: Number of simulation paths
+        return_tilt: Adjustment to expected return (additive)
+        volatility_tilt: Adjustment to volatility (multiplicative)
+        seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        precision: 'float32' (default) or 'float64'
+        innovations: 'normal' or 't' (unit-variance Student-t shocks)
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value for the probability of reaching it
+
+    Returns:
+        Tuple of (simulated paths array, statistics dict). The statistics
+        include the fitted 'omega', 'alpha' and 'beta'.
+    """
+    if innovations not in ('normal', 't'):
+        raise ValueError(f"Unknown innovation distribution: {innovations}")
+    dtype = _resolve_dtype(precision)
+    rng = make_rng(seed, rng)
+
+    portfolio_returns = _portfolio_returns(returns, weights)
+    if portfolio_returns is None:
+        return np.zeros((n_simulations, horizon_days + 1)), {}
+
+    mu = portfolio_returns.mean() + (return_tilt / 252)
+    garch = fit_garch11(portfolio_returns)
+    scale = dtype(volatility_tilt ** 2)
+
+    if innovations == 't':
+        Z = _student_t_shocks(rng, fit_student_t_df(portfolio_returns), (n_simulations, horizon_days), dtype)
+    else:
+        Z = rng.standard_normal((n_simulations, horizon_days), dtype=dtype)
+
+    omega, alpha, beta = dtype(garch['omega']), dtype(garch['alpha']), dtype(garch['beta'])
+
+    # Reuse the shock array for log returns: column t is read before it is overwritten
+    log_increments = Z
+    variance = np.full(n_simulations, garch['last_variance'], dtype=dtype)
+    for t in range(horizon_days):
+        sigma_t = np.sqrt(variance * scale)
+        eps = sigma_t * Z[:, t]
+        log_increments[:, t] = dtype(mu) - dtype(0.5) * sigma_t**2 + eps
+        # Unscaled residual drives the next day's variance
+        variance = omega + alpha * (eps * eps / scale) + beta * variance
+
+    paths = _compound_log_returns(initial_value, log_increments, dtype)
+
+    stats = _summarize_paths(paths, initial_value, var_levels, target_value)
+    stats.update({k: garch[k] for k in ('omega', 'alpha', 'beta')})
+
+    return paths, stats
+
+
+def monte_carlo_regime_switching(
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    initial_value: float,
+    horizon_days: int,
+    n_simulations: int = 1000,
+    return_tilt: float = 0.0,
+    volatility_tilt: float = 1.0,
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    precision: str = 'float64',
+    n_regimes: int = 3,
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None
+) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    Monte Carlo simulation with Markov regime switching
+
+    Each path moves between calm, stressed and (optionally) crisis regimes
+    with the transition probabilities observed historically, starting from
+    today's regime. Within a regime, daily returns are Gaussian with that
+    regime's asset means and covariance, projected onto the portfolio weights.
+    Regime paths for all simulations are drawn together, one day at a time.
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        horizon_days: Simulation horizon in days
+        n_simulations: Number of simulation paths
+        return_tilt: Adjustment to expected return (additive, every regime)
+        volatility_tilt: Adjustment to volatility (multiplicative, every regime)
+        seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        precision: 'float64' or 'float32'
+        n_regimes: 2 (calm / stressed) or 3 (calm / stressed / crisis)
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value for the probability of reaching it
+
+    Returns:
+        Tuple of (simulated paths array, statistics dict). The statistics
+        add the share of simulated days spent in each regime as
+        'time_in_<regime>'.
+    """
+    dtype = _resolve_dtype(precision)
+    rng = make_rng(seed, rng)
+
+    regimes = fit_regimes(returns, weights, n_regimes)
+    if regimes is None:
+        return np.zeros((n_simulations, horizon_days + 1)), {}
+
+    w = regimes['weights']
+    mu = np.array([w @ m for m in regimes['means']]) + (return_tilt / 252)
+    sigma = np.sqrt([w @ c @ w for c in regimes['covariances']]) * volatility_tilt
+
+    # Day t's regime is the number of cumulative transition probabilities below u.
+    # Day-major layout keeps each day's draws and states contiguous.
+    cumulative = np.cumsum(regimes['transition_matrix'], axis=1)
+    U = rng.random((horizon_days, n_simulations))
+    states = np.empty((horizon_days, n_simulations), dtype=np.int8)
+    current = np.full(n_simulations, regimes['current_regime'], dtype=np.intp)
+    for t in range(horizon_days):
+        next_state = np.zeros(n_simulations, dtype=np.intp)
+        for k in range(n_regimes - 1):
+            next_state += U[t] > cumulative[current, k]
+        current = next_state
+        states[t] = current
+    states = states.T
+
+    drift = (mu - 0.5 * sigma**2).astype(dtype)
+    Z = rng.standard_normal((n_simulations, horizon_days), dtype=dtype)
+    log_increments = drift[states] + sigma.astype(dtype)[states] * Z
+    paths = _compound_log_returns(initial_value, log_increments, dtype)
+
+    stats = _summarize_paths(paths, initial_value, var_levels, target_value)
+    occupancy = np.bincount(states.ravel(), minlength=n_regimes) / states.size
+    for name, share in zip(regimes['names'], occupancy):
+        stats[f'time_in_{name}'] = share
+
+    return paths, stats
+
+
+def simulate_rebalanced_portfolio(
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    initial_value: float,
+    horizon_days: int,
+    n_simulations: int = 1000,
+    rebalance: str = 'quarterly',
+    threshold: float = 0.05,
+    contribution: float = 0.0,
+    contribution_interval: int = 21,
+    transaction_cost: float = 0.001,
+    block_size: int = 20,
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None
+) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    Simulate per-asset holdings with rebalancing, cash flows and trading costs
+
+    Asset returns are drawn jointly by a stationary bootstrap of historical
+    days, so cross-asset correlation and volatility clustering carry over.
+    Holdings drift with their own returns and are traded back to the target
+    weights on the rebalancing schedule. Every step is a batched array
+    operation over all paths.
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Target portfolio weights
+        initial_value: Starting portfolio value
+        horizon_days: Simulation horizon in days
+        n_simulations: Number of simulation paths
+        rebalance: 'none', 'monthly', 'quarterly', 'annually' or 'threshold'
+        threshold: Largest allowed weight drift before a 'threshold' rebalance
+        contribution: Cash added (negative = withdrawn) every contribution_interval days
+        contribution_interval: Days between cash flows
+        transaction_cost: Cost as a fraction of traded value
+        block_size: Mean block length of the bootstrap (1 = simple bootstrap)
+        seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value for the probability of reaching it
+
+    Returns:
+        Tuple of (simulated total-value paths array, statistics dict). The
+        statistics add 'avg_turnover', 'avg_costs', 'avg_rebalances' and
+        'prob_depleted'.
+    """
+    if rebalance not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"Unknown rebalancing schedule: {rebalance}")
+    rng = make_rng(seed, rng)
+
+    # Align returns with weights
+    context, target = get_returns_context(returns).align(weights)
+    if context is None:
+        return np.zeros((n_simulations, horizon_days + 1)), {}
+
+    asset_returns = context.matrix
+
+    idx = _bootstrap_indices(rng, len(asset_returns), n_simulations, horizon_days, 'stationary', block_size)
+    period = REBALANCE_FREQUENCIES[rebalance]
+    gross_returns = 1 + asset_returns
+
+    holdings = np.outer(np.full(n_simulations, float(initial_value)), target)
+    paths = np.empty((n_simulations, horizon_days + 1))
     paths[:, 0] = initial_value
+    turnover = np.zeros(n_simulations)
+    costs = np.zeros(n_simulations)
+    rebalances = np.zeros(n_simulations)
 
-    for sim in range(n_simulations):
-        # Sample returns with replacement
-        if block_size == 1:
-            sampled_returns = np.random.choice(portfolio_returns, size=horizon_days, replace=True)
+    for t in range(horizon_days):
+        day = t + 1
+        holdings *= gross_returns[idx[:, t]]
+        total = holdings.sum(axis=1)
+
+        # Cash flows: contributions buy the target mix, withdrawals sell pro rata
+        if contribution != 0 and day % contribution_interval == 0:
+            if contribution > 0:
+                holdings += contribution * target
+            else:
+                keep = np.clip(1 + contribution / np.where(total > 0, total, np.inf), 0, 1)
+                holdings *= keep[:, None]
+            total = holdings.sum(axis=1)
+
+        # Which paths trade today
+        if rebalance == 'threshold':
+            # Drift beyond the band on either side: any holding outside target +/- threshold
+            upper = (total * threshold)[:, None] + total[:, None] * target
+            lower = upper - (2 * total * threshold)[:, None]
+            trade = ((holdings > upper) | (holdings < lower)).any(axis=1) & (total > 0)
+        elif period is not None and day % period == 0:
+            trade = total > 0
         else:
-            # Block bootstrap
-            n_blocks = int(np.ceil(horizon_days / block_size))
-            sampled_returns = []
-            for _ in range(n_blocks):
-                start_idx = np.random.randint(0, len(portfolio_returns) - block_size + 1)
-                sampled_returns.extend(portfolio_returns[start_idx:start_idx + block_size])
-            sampled_returns = np.array(sampled_returns[:horizon_days])
-
-        # Build path
-        for t in range(1, horizon_days + 1):
-            paths[sim, t] = paths[sim, t-1] * (1 + sampled_returns[t-1])
+            trade = None
+
+        if trade is not None:
+            rows = np.flatnonzero(trade)
+            if len(rows) > 0:
+                row_total = total[rows]
+                traded = np.abs(row_total[:, None] * target - holdings[rows]).sum(axis=1)
+                cost = transaction_cost * traded
+                holdings[rows] = (row_total - cost)[:, None] * target
+                total[rows] = row_total - cost
+                turnover[rows] += traded / row_total
+                costs[rows] += cost
+                rebalances[rows] += 1
+
+        paths[:, day] = total
 
     # Calculate statistics
-    terminal_values = paths[:, -1]
-    stats = {
-        'mean': np.mean(terminal_values),
-        'median': np.median(terminal_values),
-        'std': np.std(terminal_values),
-        'p10': np.percentile(terminal_values, 10),
-        'p25': np.percentile(terminal_values, 25),
-        'p50': np.percentile(terminal_values, 50),
-        'p75': np.percentile(terminal_values, 75),
-        'p90': np.percentile(terminal_values, 90),
-        'min': np.min(terminal_values),
-        'max': np.max(terminal_values)
-    }
+    stats = _summarize_paths(paths, initial_value, var_levels, target_value)
+    stats['avg_turnover'] = turnover.mean()
+    stats['avg_costs'] = costs.mean()
+    stats['avg_rebalances'] = rebalances.mean()
+    stats['prob_depleted'] = np.mean(paths[:, -1] <= 0)
 
     return paths, stats
 
 
-def calculate_percentile_bands(paths: np.ndarray, percentiles: list = [10, 50, 90]) -> pd.DataFrame:
+def fit_student_t_df(portfolio_returns: np.ndarray) -> float:
     """
-    Calculate percentile bands from simulation paths
+    Maximum-likelihood degrees of freedom of a Student-t fit to returns
 
     Args:
-        paths: Array of simulation paths (n_simulations x horizon)
-        percentiles: List of percentiles to calculate
+        portfolio_returns: Daily returns
 
     Returns:
-        DataFrame with percentile bands over time
+        Degrees of freedom, kept within [2.5, 100] so variance stays finite
     """
-    horizon = paths.shape[1]
+    x = np.asarray(portfolio_returns, dtype=np.float64)
+    x = (x - x.mean()) / x.std(ddof=1) if x.std(ddof=1) > 0 else x
+    df, _, _ = student_t.fit(x)
+    return float(np.clip(df, 2.5, 100.0))
 
-    data = {'Day': range(horizon)}
-    for p in percentiles:
-        data[f'P{p}'] = np.percentile(paths, p, axis=0)
 
-    return pd.DataFrame(data)
+def fit_garch11(portfolio_returns: np.ndarray) -> Dict[str, float]:
+    """
+    Maximum-likelihood GARCH(1,1) fit with Gaussian quasi-likelihood
+
+    Uses variance targeting: omega is tied to the sample variance, leaving
+    only alpha and beta to the optimizer.
+
+    Args:
+        portfolio_returns: Daily returns
+
+    Returns:
+        Dictionary with 'omega', 'alpha', 'beta' and 'last_variance' (the
+        conditional variance for the day after the sample)
+    """
+    e = np.asarray(portfolio_returns, dtype=np.float64)
+    e = e - e.mean()
+    e2 = e * e
+    sample_var = e2.mean()
+
+    def conditional_variance(params: np.ndarray) -> np.ndarray:
+        alpha, beta = params
+        omega = sample_var * (1 - alpha - beta)
+        # sigma2[t] = omega + alpha * e2[t-1] + beta * sigma2[t-1], sigma2[0] = sample variance
+        sigma2 = np.empty(len(e2) + 1)
+        sigma2[0] = sample_var
+        sigma2[1:] = lfilter([1.0], [1.0, -beta], omega + alpha * e2, zi=[beta * sample_var])[0]
+        return sigma2
+
+    def neg_log_likelihood(params: np.ndarray) -> float:
+        if params[0] + params[1] >= 0.999:
+            return 1e10
+        sigma2 = conditional_variance(params)[:-1]
+        return 0.5 * np.sum(np.log(sigma2) + e2 / sigma2)
+
+    x0 = np.array([0.05, 0.90])
+    result = minimize(neg_log_likelihood, x0, method='L-BFGS-B', bounds=[(0.0, 0.999), (0.0, 0.999)])
+    params = result.x if neg_log_likelihood(result.x) <= neg_log_likelihood(x0) else x0
+    sigma2 = conditional_variance(params)
+
+    return {
+        'omega': float(sample_var * (1 - params[0] - params[1])),
+        'alpha': float(params[0]),
+        'beta': float(params[1]),
+        'last_variance': float(sigma2[-1])
+    }
+
+
+def fit_regimes(
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    n_regimes: int = 3,
+    window: int = 21
+) -> Optional[Dict[str, Any]]:
+    """
+    Label historical days by volatility regime and estimate each regime
+
+    Days are bucketed by the portfolio's trailing volatility at the
+    REGIME_QUANTILES cut-offs. Transition probabilities are counted from
+    consecutive labels, and each regime gets its own asset mean vector and
+    covariance matrix.
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        n_regimes: 2 or 3
+        window: Trailing window in days for the volatility used to label days
+
+    Returns:
+        Dictionary with 'names', 'labels', 'transition_matrix', 'means',
+        'covariances' (daily, per asset), 'current_regime' and the aligned
+        'weights', or None if no weighted ticker has returns
+    """
+    if n_regimes not in REGIME_NAMES:
+        raise ValueError(f"Unsupported number of regimes: {n_regimes}")
+
+    context, w = get_returns_context(returns).align(weights)
+    if context is None:
+        return None
+
+    tickers = context.tickers
+    asset_returns = context.matrix
+
+    trailing_vol = pd.Series(asset_returns @ w).rolling(window, min_periods=2).std().bfill().values
+    if np.isnan(trailing_vol).all():
+        trailing_vol = np.zeros(len(asset_returns))
+    labels = np.digitize(trailing_vol, np.quantile(trailing_vol, REGIME_QUANTILES[n_regimes]))
+
+    # Rows with no observed exits stay put, so every row is a distribution
+    counts = np.zeros((n_regimes, n_regimes))
+    np.add.at(counts, (labels[:-1], labels[1:]), 1)
+    counts[counts.sum(axis=1) == 0] += np.eye(n_regimes)[counts.sum(axis=1) == 0]
+    transition_matrix = counts / counts.sum(axis=1, keepdims=True)
+
+    # Regimes with too few days to estimate fall back to the full sample
+    pooled_cov = np.atleast_2d(np.cov(asset_returns, rowvar=False))
+    means, covariances = [], []
+    for k in range(n_regimes):
+        in_regime = asset_returns[labels == k]
+        if len(in_regime) > 1:
+            means.append(in_regime.mean(axis=0))
+            covariances.append(np.atleast_2d(np.cov(in_regime, rowvar=False)))
+        else:
+            means.append(asset_returns.mean(axis=0))
+            covariances.append(pooled_cov)
+
+    return {
+        'names': REGIME_NAMES[n_regimes],
+        'labels': labels,
+        'transition_matrix': transition_matrix,
+        'means': means,
+        'covariances': covariances,
+        'current_regime': int(labels[-1]),
+        'weights': w
+    }
+
+
+def _resolve_dtype(precision: str) -> type:
+    """
+    Map a precision name to its NumPy floating-point type
+
+    Args:
+        precision: 'float64' or 'float32'
+
+    Returns:
+        NumPy dtype class
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    return PRECISIONS[precision]
+
+
+def _compound_log_returns(initial_value: float, log_returns: np.ndarray, dtype: type = np.float64) -> np.ndarray:
+    """
+    Build value paths from daily log returns
+
+    Log returns are summed within blocks of LOG_SUM_BLOCK days and the block
+    totals carried forward, so rounding error grows with the number of
+    blocks rather than the number of days. In float32 this keeps relative
+    drift near 1e-6 over multi-year horizons.
+
+    Args:
+        initial_value: Starting portfolio value
+        log_returns: Daily log returns (n_paths x horizon_days)
+        dtype: Floating-point type of the result
+
+    Returns:
+        Paths array (n_paths x horizon_days + 1) starting at initial_value
+    """
+    n_paths, horizon = log_returns.shape
+    cumulative = np.empty((n_paths, horizon), dtype=dtype)
+    carry = np.zeros(n_paths, dtype=dtype)
+
+    for start in range(0, horizon, LOG_SUM_BLOCK):
+        stop = min(start + LOG_SUM_BLOCK, horizon)
+        np.cumsum(log_returns[:, start:stop], axis=1, dtype=dtype, out=cumulative[:, start:stop])
+        cumulative[:, start:stop] += carry[:, None]
+        carry = cumulative[:, stop - 1]
+
+    paths = np.empty((n_paths, horizon + 1), dtype=dtype)
+    paths[:, 0] = initial_value
+    np.exp(cumulative, out=paths[:, 1:])
+    paths[:, 1:] *= dtype(initial_value)
+    return paths
+
+
+def _portfolio_returns(returns: ReturnsLike, weights: Dict[str, float]) -> Optional[np.ndarray]:
+    """
+    Historical daily returns of the weighted portfolio
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+
+    Returns:
+        Array of portfolio returns, or None if no weighted ticker has returns
+    """
+    context, weights_array = get_returns_context(returns).align(weights)
+    if context is None:
+        return None
+
+    return context.portfolio_returns(weights_array)
+
+
+def _gbm_parameters(
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    return_tilt: float = 0.0,
+    volatility_tilt: float = 1.0
+) -> Optional[Tuple[float, float]]:
+    """
+    Daily GBM drift and volatility of the weighted portfolio
+
+    Args:
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        return_tilt: Adjustment to expected return (additive, annual)
+        volatility_tilt: Adjustment to volatility (multiplicative)
+
+    Returns:
+        Tuple of (daily mu, daily sigma), or None if no weighted ticker has returns
+    """
+    context, weights_array = get_returns_context(returns).align(weights)
+    if context is None:
+        return None
+
+    if context.has_missing:
+        portfolio_returns = context.portfolio_returns(weights_array)
+        mean, std = portfolio_returns.mean(), portfolio_returns.std(ddof=1)
+    else:
+        # Portfolio moments straight from the shared asset moments
+        mean = weights_array @ context.mean
+        std = np.sqrt(weights_array @ context.cov @ weights_array)
+
+    mu = mean + (return_tilt / 252)          # Daily return with tilt
+    sigma = std * volatility_tilt            # Daily volatility with tilt
+
+    return mu, sigma
+
+
+def _gbm_batch(
+    rng: np.random.Generator,
+    mu: float,
+    sigma: float,
+    initial_value: float,
+    horizon_days: int,
+    n_simulations: int,
+    variance_reduction: str = 'none',
+    dtype: type = np.float64
+) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Simulate one batch of GBM paths
+
+    Args:
+        rng: Random generator
+        mu: Daily drift
+        sigma: Daily volatility
+        initial_value: Starting portfolio value
+        horizon_days: Simulation horizon in days
+        n_simulations: Number of simulation paths
+        variance_reduction: Sampling scheme (see VARIANCE_REDUCTION_METHODS)
+        dtype: Floating-point type of the generated paths
+
+    Returns:
+        Tuple of (paths array, control-variate weight per path or None,
+        Sobol replicate id per path or None, control variate per path or None)
+    """
+    # Generate shocks for all paths and days at once
+    Z, batch_ids = _gbm_shocks(rng, n_simulations, horizon_days, variance_reduction, dtype)
+
+    # GBM formula: S(t) = S(t-1) * exp((mu - 0.5*sigma^2)*dt + sigma*sqrt(dt)*Z), dt = 1 day
+    log_increments = dtype(mu - 0.5 * sigma**2) + dtype(sigma) * Z
+    paths = _compound_log_returns(initial_value, log_increments, dtype)
+
+    path_weights = None
+    control = None
+    if variance_reduction == 'control_variate':
+        # The summed shocks W_T drive the terminal value and have known mean zero
+        control = Z.sum(axis=1, dtype=np.float64)
+        path_weights = _control_variate_weights(control, 0.0)
+
+    return paths, path_weights, batch_ids, control
+
+
+def _gbm_shocks(
+    rng: np.random.Generator,
+    n_simulations: int,
+    horizon_days: int,
+    variance_reduction: str = 'none',
+    dtype: type = np.float64
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Draw standard normal shocks for every path and day
+
+    Args:
+        rng: Random generator
+        n_simulations: Number of simulation paths
+        horizon_days: Simulation horizon in days
+        variance_reduction: Sampling scheme (see VARIANCE_REDUCTION_METHODS)
+        dtype: Floating-point type of the shocks
+
+    Returns:
+        Tuple of (shocks array n_simulations x horizon_days, replicate id per
+        path for Sobol runs or None)
+    """
+    if variance_reduction == 'antithetic':
+        # Path i + half mirrors path i, so the pair's shocks cancel exactly
+        half = (n_simulations + 1) // 2
+        Z = rng.standard_normal((half, horizon_days), dtype=dtype)
+        return np.concatenate([Z, -Z])[:n_simulations], None
+
+    if variance_reduction == 'sobol':
+        # Scrambled Sobol points mapped through the inverse normal CDF. Several
+        # independent scrambles give an honest error estimate for the run.
+        batch_ids = np.arange(n_simulations) % SOBOL_REPLICATES
+        Z = np.empty((n_simulations, horizon_days))
+        for b in range(SOBOL_REPLICATES):
+            rows = batch_ids == b
+            n_rows = int(rows.sum())
+            if n_rows == 0:
+                continue
+            sampler = qmc.Sobol(d=horizon_days, scramble=True, seed=rng)
+            with warnings.catch_warnings():
+                # Sobol balance is best at powers of two, but any count is valid
+                warnings.simplefilter('ignore', UserWarning)
+                u = sampler.random(n_rows)
+            Z[rows] = norm.ppf(np.clip(u, 1e-12, 1 - 1e-12))
+        return _brownian_bridge(Z).astype(dtype, copy=False), batch_ids
+
+    return rng.standard_normal((n_simulations, horizon_days), dtype=dtype), None
+
+
+def _student_t_shocks(
+    rng: np.random.Generator,
+    df: float,
+    shape: Tuple[int, int],
+    dtype: type = np.float64
+) -> np.ndarray:
+    """
+    Unit-variance Student-t shocks
+
+    Args:
+        rng: Random generator
+        df: Degrees of freedom (> 2)
+        shape: Output shape
+        dtype: Floating-point type of the shocks
+
+    Returns:
+        Array of shocks with mean 0 and variance 1
+    """
+    # t = Z / sqrt(V / df) with V ~ chi2(df), rescaled from variance df / (df - 2) to 1
+    Z = rng.standard_normal(shape, dtype=dtype)
+    V = rng.standard_gamma(df / 2, size=shape, dtype=dtype)
+    np.divide(dtype(df - 2) / 2, V, out=V)
+    np.sqrt(V, out=V)
+    Z *= V
+    return Z
+
+
+def _brownian_bridge(Z: np.ndarray) -> np.ndarray:
+    """
+    Turn normals into daily shocks with a Brownian bridge construction
+
+    The first column fixes the terminal point and later columns fill in
+    midpoints, so the low (best distributed) Sobol dimensions drive the
+    horizon-level outcome.
+
+    Args:
+        Z: Standard normals (n_paths x horizon_days)
+
+    Returns:
+        Standard normal daily shocks with the same shape
+    """
+    n_paths, horizon = Z.shape
+    W = np.zeros((n_paths, horizon + 1))
+    W[:, horizon] = np.sqrt(horizon) * Z[:, 0]
+
+    intervals = [(0, horizon)]
+    k = 1
+    while intervals:
+        left, right = intervals.pop(0)
+        if right - left < 2:
+            continue
+        mid = (left + right) // 2
+        span = right - left
+        W[:, mid] = (
+            ((right - mid) * W[:, left] + (mid - left) * W[:, right]) / span
+            + np.sqrt((mid - left) * (right - mid) / span) * Z[:, k]
+        )
+        k += 1
+        intervals.append((left, mid))
+        intervals.append((mid, right))
+
+    return np.diff(W, axis=1)
+
+
+def _bootstrap_indices(
+    rng: np.random.Generator,
+    n_obs: int,
+    n_simulations: int,
+    horizon_days: int,
+    method: str = 'stationary',
+    block_size: int = 20
+) -> np.ndarray:
+    """
+    Indices into the historical series for every path and day
+
+    Args:
+        rng: Random generator
+        n_obs: Length of the historical series
+        n_simulations: Number of simulation paths
+        horizon_days: Simulation horizon in days
+        method: 'stationary', 'block' or 'iid'
+        block_size: Block length ('block') or mean block length ('stationary')
+
+    Returns:
+        Integer array (n_simulations x horizon_days)
+    """
+    block_size = max(1, min(int(block_size), n_obs))
+
+    if method == 'iid' or block_size == 1:
+        return rng.integers(0, n_obs, size=(n_simulations, horizon_days))
+
+    days = np.arange(horizon_days)
+
+    if method == 'block':
+        # Day t of a path reads offset t % b of block t // b
+        starts = rng.integers(0, n_obs - block_size + 1, size=(n_simulations, -(-horizon_days // block_size)))
+        return starts[:, days // block_size] + days % block_size
+
+    # Stationary bootstrap: each day starts a new block with probability 1/b,
+    # giving geometric block lengths with mean b. Blocks wrap around the end
+    # of the history so every day is equally likely to be drawn.
+    restart = rng.random((n_simulations, horizon_days)) < 1.0 / block_size
+    restart[:, 0] = True
+
+    # Random start for each block, looked up through a running block counter
+    block_starts = rng.integers(0, n_obs, size=int(restart.sum()))
+    block_ids = np.cumsum(restart.ravel()).reshape(restart.shape) - 1
+
+    # Day on which the current block began
+    block_first_day = np.maximum.accumulate(np.where(restart, days, 0), axis=1)
+
+    return (block_starts[block_ids] + (days - block_first_day)) % n_obs
+
+
+def _control_variate_weights(control: np.ndarray, control_mean: float) -> np.ndarray:
+    """
+    Control-variate weights for the empirical distribution of a simulation
+
+    The weights sum to one and make the weighted mean of the control equal to
+    its known expectation (Hesterberg & Nelson). Weighted means and
+    percentiles of any correlated quantity inherit the variance reduction.
+    Negative weights, possible in small samples, are clipped to zero so the
+    weighted distribution stays valid.
+
+    Args:
+        control: Control variate value per path
+        control_mean: Known expectation of the control variate
+
+    Returns:
+        Array of per-path weights
+    """
+    n = len(control)
+    deviations = control - control.mean()
+    ss = np.sum(deviations ** 2)
+    if ss <= 0:
+        return np.full(n, 1.0 / n)
+    weights = np.maximum(1.0 / n + (control_mean - control.mean()) * deviations / ss, 0.0)
+    return weights / weights.sum()
+
+
+def _weighted_percentile(values: np.ndarray, weights: np.ndarray, q: float) -> float:
+    """
+    Percentile of values under an empirical distribution with given weights
+
+    Args:
+        values: Sample values
+        weights: Weight per sample (summing to one)
+        q: Percentile in [0, 100]
+
+    Returns:
+        Weighted percentile
+    """
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    idx = np.searchsorted(cumulative, q / 100 * cumulative[-1])
+    return values[order][min(idx, len(values) - 1)]
+
+
+def _terminal_stats(terminal_values: np.ndarray, weights: Optional[np.ndarray] = None) -> Dict[str, float]:
+    """
+    Summary statistics of simulated terminal values
+
+    Args:
+        terminal_values: Portfolio value at the end of each path
+        weights: Optional per-path weights (e.g. from a control variate)
+
+    Returns:
+        Statistics dict
+    """
+    if weights is None:
+        return {
+            'mean': np.mean(terminal_values),
+            'median': np.median(terminal_values),
+            'std': np.std(terminal_values),
+            'p10': np.percentile(terminal_values, 10),
+            'p25': np.percentile(terminal_values, 25),
+            'p50': np.percentile(terminal_values, 50),
+            'p75': np.percentile(terminal_values, 75),
+            'p90': np.percentile(terminal_values, 90),
+            'min': np.min(terminal_values),
+            'max': np.max(terminal_values)
+        }
+
+    mean = np.sum(weights * terminal_values)
+    median = _weighted_percentile(terminal_values, weights, 50)
+    return {
+        'mean': mean,
+        'median': median,
+        'std': np.sqrt(max(np.sum(weights * (terminal_values - mean) ** 2), 0.0)),
+        'p10': _weighted_percentile(terminal_values, weights, 10),
+        'p25': _weighted_percentile(terminal_values, weights, 25),
+        'p50': median,
+        'p75': _weighted_percentile(terminal_values, weights, 75),
+        'p90': _weighted_percentile(terminal_values, weights, 90),
+        'min': np.min(terminal_values),
+        'max': np.max(terminal_values)
+    }
+
+
+def _max_drawdowns(paths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest peak-to-trough decline along each path
+
+    Args:
+        paths: Simulated value paths (n_paths x horizon + 1)
+
+    Returns:
+        Tuple of (max drawdown per path as a fraction of the peak, highest
+        value reached per path)
+    """
+    running_peak = np.maximum.accumulate(paths, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = 1 - np.min(np.where(running_peak > 0, paths / running_peak, 1), axis=1)
+    return drawdowns.astype(np.float64), running_peak[:, -1].astype(np.float64)
+
+
+def _tail_stats(
+    terminal_values: np.ndarray,
+    max_drawdowns: np.ndarray,
+    path_peaks: np.ndarray,
+    initial_value: float,
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None,
+    weights: Optional[np.ndarray] = None
+) -> Dict[str, float]:
+    """
+    Tail-risk metrics of a simulation
+
+    Losses are measured in currency against the initial value. For each
+    level L the dict holds 'var_<L>' (loss exceeded with probability 1 - L)
+    and 'cvar_<L>' (average loss beyond it), e.g. 'var_95' and 'cvar_95'.
+    It also holds 'prob_loss', the mean and percentiles of the maximum
+    drawdown ('max_drawdown_mean', 'max_drawdown_p50', 'max_drawdown_p90',
+    'max_drawdown_p99') and, when a target is given, 'prob_target' (ending
+    at or above it) and 'prob_touch_target' (reaching it at any time).
+
+    Args:
+        terminal_values: Portfolio value at the end of each path
+        max_drawdowns: Max drawdown per path (fraction)
+        path_peaks: Highest value reached per path
+        initial_value: Starting portfolio value
+        var_levels: Confidence levels (default TAIL_LEVELS)
+        target_value: Optional goal value
+        weights: Optional per-path weights summing to one
+
+    Returns:
+        Dictionary of tail-risk metrics
+    """
+    def percentile(values: np.ndarray, q: float) -> float:
+        if weights is None:
+            return np.percentile(values, q)
+        return _weighted_percentile(values, weights, q)
+
+    if weights is None:
+        path_weights = np.full(len(terminal_values), 1.0 / len(terminal_values))
+    else:
+        path_weights = weights
+
+    losses = initial_value - terminal_values
+    stats = {'prob_loss': np.sum(path_weights * (terminal_values < initial_value))}
+
+    for level in (TAIL_LEVELS if var_levels is None else var_levels):
+        key = f"{level * 100:g}".replace('.', '_')
+        var = percentile(losses, level * 100)
+        tail = losses >= var
+        tail_weight = np.sum(path_weights[tail])
+        stats[f'var_{key}'] = var
+        stats[f'cvar_{key}'] = np.sum(path_weights[tail] * losses[tail]) / tail_weight if tail_weight > 0 else var
+
+    stats['max_drawdown_mean'] = np.sum(path_weights * max_drawdowns)
+    for q in (50, 90, 99):
+        stats[f'max_drawdown_p{q}'] = percentile(max_drawdowns, q)
+
+    if target_value is not None:
+        stats['prob_target'] = np.sum(path_weights * (terminal_values >= target_value))
+        stats['prob_touch_target'] = np.sum(path_weights * (path_peaks >= target_value))
+
+    return stats
+
+
+class _RiskAccumulator:
+    """Collects per-path summaries chunk by chunk so full path matrices need not be kept"""
+
+    def __init__(self):
+        self._terminal: List[np.ndarray] = []
+        self._drawdowns: List[np.ndarray] = []
+        self._peaks: List[np.ndarray] = []
+        self._weights: List[Optional[np.ndarray]] = []
+        self._std_errors: List[Optional[float]] = []
+
+    def add(self, paths: np.ndarray, path_weights: Optional[np.ndarray] = None, std_error: Optional[float] = None):
+        """
+        Summarize one chunk of paths
+
+        Args:
+            paths: Chunk of simulated paths
+            path_weights: Optional per-path weights summing to one within the chunk
+            std_error: Standard error of the chunk's mean, if known
+        """
+        drawdowns, peaks = _max_drawdowns(paths)
+        self._terminal.append(paths[:, -1].astype(np.float64))
+        self._drawdowns.append(drawdowns)
+        self._peaks.append(peaks)
+        self._weights.append(path_weights)
+        self._std_errors.append(std_error)
+
+    def stats(
+        self,
+        initial_value: float,
+        var_levels: Optional[List[float]] = None,
+        target_value: Optional[float] = None
+    ) -> Dict[str, float]:
+        """
+        Terminal and tail-risk statistics over all chunks
+
+        Chunks are pooled as a mixture weighted by their path counts.
+
+        Args:
+            initial_value: Starting portfolio value
+            var_levels: Confidence levels for VaR / CVaR
+            target_value: Optional goal value
+
+        Returns:
+            Statistics dict
+        """
+        terminal_values = np.concatenate(self._terminal)
+        n_total = len(terminal_values)
+
+        weights = None
+        if any(w is not None for w in self._weights):
+            weights = np.concatenate([
+                (w if w is not None else np.full(len(t), 1.0 / len(t))) * (len(t) / n_total)
+                for w, t in zip(self._weights, self._terminal)
+            ])
+
+        stats = _terminal_stats(terminal_values, weights)
+        stats.update(_tail_stats(
+            terminal_values,
+            np.concatenate(self._drawdowns),
+            np.concatenate(self._peaks),
+            initial_value,
+            var_levels,
+            target_value,
+            weights
+        ))
+
+        # Independent chunks: combine their errors, falling back to the iid estimate
+        if all(se is not None for se in self._std_errors):
+            stats['std_error'] = np.sqrt(sum(
+                (len(t) / n_total) ** 2 * se ** 2 for t, se in zip(self._terminal, self._std_errors)
+            ))
+        else:
+            stats['std_error'] = _mean_standard_error(terminal_values)
+
+        return stats
+
+
+def _summarize_paths(
+    paths: np.ndarray,
+    initial_value: float,
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None
+) -> Dict[str, float]:
+    """
+    Terminal and tail-risk statistics of an iid set of paths
+
+    Args:
+        paths: Simulated value paths
+        initial_value: Starting portfolio value
+        var_levels: Confidence levels for VaR / CVaR
+        target_value: Optional goal value
+
+    Returns:
+        Statistics dict
+    """
+    accumulator = _RiskAccumulator()
+    accumulator.add(paths)
+    return accumulator.stats(initial_value, var_levels, target_value)
+
+
+def _mean_standard_error(
+    terminal_values: np.ndarray,
+    variance_reduction: str = 'none',
+    batch_ids: Optional[np.ndarray] = None,
+    control: Optional[np.ndarray] = None
+) -> float:
+    """
+    Standard error of the expected terminal value under a sampling scheme
+
+    Args:
+        terminal_values: Portfolio value at the end of each path
+        variance_reduction: Sampling scheme used to generate the paths
+        batch_ids: Sobol replicate id per path
+        control: Control variate per path (control_variate runs)
+
+    Returns:
+        Standard error of the mean estimate
+    """
+    n = len(terminal_values)
+    if n < 2:
+        return 0.0
+
+    if variance_reduction == 'antithetic':
+        # Pairs are independent of each other, so average within pairs first
+        half = n // 2
+        offset = (n + 1) // 2
+        pair_means = 0.5 * (terminal_values[:half] + terminal_values[offset:offset + half])
+        if half < 2:
+            return 0.0
+        return np.std(pair_means, ddof=1) / np.sqrt(half)
+
+    if variance_reduction == 'control_variate' and control is not None and n > 2:
+        # Error of the regression estimator: spread of the residuals after
+        # removing the part of the terminal value explained by the control
+        deviations = control - control.mean()
+        ss = np.sum(deviations ** 2)
+        slope = np.sum(deviations * (terminal_values - terminal_values.mean())) / ss if ss > 0 else 0.0
+        residuals = terminal_values - terminal_values.mean() - slope * deviations
+        return np.sqrt(np.sum(residuals ** 2) / (n - 2)) / np.sqrt(n)
+
+    if variance_reduction == 'sobol' and batch_ids is not None:
+        batch_means = np.array([terminal_values[batch_ids == b].mean() for b in np.unique(batch_ids)])
+        if len(batch_means) < 2:
+            return 0.0
+        return np.std(batch_means, ddof=1) / np.sqrt(len(batch_means))
+
+    return np.std(terminal_values, ddof=1) / np.sqrt(n)
+
+
+def calculate_percentile_bands(
+    paths: np.ndarray,
+    percentiles: list = [10, 50, 90],
+    max_points: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Calculate percentile bands from simulation paths
+
+    All percentiles of a block of days come from a single np.partition
+    pass, and days are processed in blocks that fit STORE_BLOCK_BYTES.
+
+    Args:
+        paths: Array of simulation paths (n_simulations x horizon)
+        percentiles: List of percentiles to calculate
+        max_points: If set, compute bands on at most this many evenly spaced
+            days (first and last day always included), e.g. for plotting
+
+    Returns:
+        DataFrame with percentile bands over time
+    """
+    horizon = paths.shape[1]
+    days = _band_days(horizon, max_points)
+
+    bands = np.empty((len(percentiles), len(days)))
+    block_days = max(1, STORE_BLOCK_BYTES // max(1, paths.shape[0] * paths.itemsize))
+    for start in range(0, len(days), block_days):
+        block = paths[:, days[start:start + block_days]]
+        bands[:, start:start + block.shape[1]] = _column_percentiles(block, percentiles)
+
+    data = {'Day': days}
+    for p, band in zip(percentiles, bands):
+        data[f'P{p}'] = band
+
+    return pd.DataFrame(data)
+
+
+def _band_days(horizon: int, max_points: Optional[int] = None) -> np.ndarray:
+    """Day indices for percentile bands: every day, or an even grid of at most max_points"""
+    if max_points is None or max_points >= horizon:
+        return np.arange(horizon)
+    return np.unique(np.linspace(0, horizon - 1, max(2, max_points)).round().astype(int))
+
+
+def _column_percentiles(values: np.ndarray, percentiles: List[float]) -> np.ndarray:
+    """
+    Linearly interpolated percentiles down each column, from one partition
+
+    Matches np.percentile's default method. Every order statistic the
+    requested percentiles touch is placed by a single np.partition call.
+
+    Args:
+        values: 2-D array (observations x columns)
+        percentiles: Percentiles in [0, 100]
+
+    Returns:
+        Array of shape (len(percentiles), columns)
+    """
+    n = values.shape[0]
+    position = np.asarray(percentiles, dtype=np.float64) / 100 * (n - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, n - 1)
+    fraction = (position - lower)[:, None]
+
+    ordered = np.partition(values, np.unique(np.concatenate([lower, upper])), axis=0)
+    low_values = ordered[lower].astype(np.float64)
+    high_values = ordered[upper].astype(np.float64)
+
+    return low_values + (high_values - low_values) * fraction
+
+
+def _result_nbytes(result: Dict[str, Any]) -> int:
+    """Approximate memory footprint of a cached simulation result"""
+    total = 0
+    for value in result.values():
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif isinstance(value, pd.DataFrame):
+            total += int(value.memory_usage(index=True).sum())
+        else:
+            total += sys.getsizeof(value)
+    return total
+
+
+def _result_view(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Caller-owned view of a cached result
+
+    Cached results are shared across sessions. Arrays are stored read-only
+    and returned as they are; DataFrames and dicts are copied, so a caller
+    modifying its result cannot corrupt the cache.
+    """
+    view = {}
+    for name, value in result.items():
+        if isinstance(value, pd.DataFrame):
+            value = value.copy()
+        elif isinstance(value, dict):
+            value = dict(value)
+        view[name] = value
+    return view
+
+
+class SimulationCache:
+    """LRU cache of simulation outputs (stats, bands, terminal values) with a size budget"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a view of the cached result for key (see _result_view), marking it most recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _result_view(entry[0])
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store a result, evicting least recently used entries over budget; its arrays become read-only"""
+        size = _result_nbytes(result)
+        if size > self.max_bytes:
+            return
+
+        result = dict(result)
+        for value in result.values():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        """Drop all cached results"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Current size of cached results in bytes"""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _cache_token(value: Any) -> Optional[str]:
+    """
+    Value-based representation of a simulator argument for cache keys
+
+    Arrays are identified by a hash of their contents, since numpy
+    abbreviates the repr of large arrays. Other objects have no reliable
+    value-based repr (the default one is their memory address).
+
+    Args:
+        value: Keyword argument value
+
+    Returns:
+        String identifying the value, or None if it cannot be keyed safely
+    """
+    if value is None or isinstance(value, (bool, int, float, str, np.generic)):
+        return f"{type(value).__name__}:{value!r}"
+
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return None
+        digest = hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+        return f"ndarray:{value.dtype.str}:{value.shape}:{digest}"
+
+    if isinstance(value, (list, tuple)):
+        items = [_cache_token(v) for v in value]
+        if any(item is None for item in items):
+            return None
+        return f"{type(value).__name__}:[{','.join(items)}]"
+
+    if isinstance(value, dict):
+        items = [(_cache_token(k), _cache_token(v)) for k, v in value.items()]
+        if any(k is None or v is None for k, v in items):
+            return None
+        return f"dict:{{{','.join(sorted(f'{k}={v}' for k, v in items))}}}"
+
+    return None
+
+
+def run_cached_simulation(
+    cache: SimulationCache,
+    simulator: Callable[..., Tuple[np.ndarray, Dict[str, float]]],
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    initial_value: float,
+    horizon_days: int,
+    percentiles: List[float] = [10, 50, 90],
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Run a simulator, or return its cached output for identical inputs
+
+    The cache key covers the returns matrix contents, weights, initial value,
+    horizon, requested bands and every simulator keyword argument (arrays
+    by content). Runs without a fixed seed are random by design and are
+    never cached, nor are runs with an argument that has no value-based
+    representation (see _cache_token).
+
+    Args:
+        cache: SimulationCache holding previous results
+        simulator: Simulation function such as monte_carlo_gbm
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        horizon_days: Simulation horizon in days
+        percentiles: Percentile bands to keep
+        **kwargs: Keyword arguments passed to the simulator
+
+    Returns:
+        Dictionary with 'stats', 'bands' (percentile bands DataFrame) and
+        'terminal_values'
+    """
+    kwarg_tokens = sorted((k, _cache_token(v)) for k, v in kwargs.items())
+    cacheable = (
+        kwargs.get('seed') is not None
+        and kwargs.get('rng') is None
+        and all(token is not None for _, token in kwarg_tokens)
+    )
+
+    key = None
+    if cacheable:
+        params = {
+            'simulator': simulator.__name__,
+            'weights': sorted((k, float(v)) for k, v in weights.items()),
+            'initial_value': float(initial_value),
+            'horizon_days': int(horizon_days),
+            'percentiles': list(percentiles),
+            'kwargs': kwarg_tokens,
+        }
+        key = hashlib.sha256(
+            (get_returns_context(returns).fingerprint + repr(params)).encode()
+        ).hexdigest()
+
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    paths, stats = simulator(returns, weights, initial_value, horizon_days, **kwargs)
+    result = {
+        'stats': stats,
+        'bands': calculate_percentile_bands(paths, percentiles),
+        'terminal_values': paths[:, -1].copy(),
+    }
+
+    if key is not None:
+        cache.put(key, result)
+        return _result_view(result)
+
+    return result
+
+
+def simulate_to_store(
+    store_path: str,
+    simulator: Callable[..., Tuple[np.ndarray, Dict[str, float]]],
+    returns: ReturnsLike,
+    weights: Dict[str, float],
+    initial_value: float,
+    horizon_days: int,
+    n_simulations: int,
+    chunk_size: int = 50000,
+    precision: str = 'float32',
+    seed: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None,
+    **kwargs
+) -> Dict[str, float]:
+    """
+    Run a simulation too large for memory, writing paths to a .npy store
+
+    The simulator is called for one chunk of paths at a time with a shared
+    random generator, and each chunk is written into a memory-mapped .npy
+    file before the next is drawn. The store is day-major (horizon + 1 rows
+    of n_simulations values), so one day's values across all paths are
+    contiguous for streaming bands and statistics. Open it with
+    open_path_store.
+
+    Args:
+        store_path: Destination .npy file (overwritten)
+        simulator: Simulation function such as monte_carlo_gbm
+        returns: Historical returns DataFrame or ReturnsContext
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        horizon_days: Simulation horizon in days
+        n_simulations: Total number of simulation paths
+        chunk_size: Paths simulated and held in memory at a time
+        precision: 'float64' or 'float32' (storage precision, also passed
+            to simulators that accept a precision)
+        seed: Random seed for reproducibility
+        rng: Optional random generator (takes precedence over seed)
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value for the probability of reaching it
+        **kwargs: Keyword arguments passed to the simulator
+
+    Returns:
+        Statistics dict over all paths, as returned by the simulators
+    """
+    if kwargs.get('variance_reduction') == 'control_variate':
+        raise ValueError("control_variate reweights paths and cannot be stored as equally weighted paths")
+    dtype = _resolve_dtype(precision)
+    rng = make_rng(seed, rng)
+    if 'precision' in inspect.signature(simulator).parameters:
+        kwargs['precision'] = precision
+
+    store = np.lib.format.open_memmap(
+        store_path, mode='w+', dtype=dtype, shape=(horizon_days + 1, n_simulations)
+    )
+    accumulator = _RiskAccumulator()
+
+    try:
+        for start in range(0, n_simulations, chunk_size):
+            stop = min(start + chunk_size, n_simulations)
+            chunk, chunk_stats = simulator(
+                returns, weights, initial_value, horizon_days,
+                n_simulations=stop - start, rng=rng, **kwargs
+            )
+            if not chunk_stats:
+                raise ValueError("Simulator produced no paths for these weights")
+            accumulator.add(chunk, std_error=chunk_stats.get('std_error'))
+            # Transpose in blocks of days so each copy stays cache-sized
+            for day in range(0, horizon_days + 1, LOG_SUM_BLOCK):
+                store[day:day + LOG_SUM_BLOCK, start:stop] = chunk[:, day:day + LOG_SUM_BLOCK].T
+        store.flush()
+    finally:
+        del store
+
+    return accumulator.stats(initial_value, var_levels, target_value)
+
+
+def open_path_store(store_path: str) -> np.memmap:
+    """
+    Open a path store written by simulate_to_store without loading it
+
+    Args:
+        store_path: .npy store file
+
+    Returns:
+        Read-only memory map of shape (horizon + 1, n_simulations); its
+        transpose is a paths array like the simulators return
+    """
+    return np.load(store_path, mmap_mode='r')
+
+
+def _store_day_blocks(store: np.ndarray, block_days: Optional[int] = None):
+    """Yield (first day, block) pairs of consecutive days read from a store"""
+    if block_days is None:
+        block_days = max(1, STORE_BLOCK_BYTES // max(1, store.shape[1] * store.itemsize))
+    for start in range(0, store.shape[0], block_days):
+        yield start, np.asarray(store[start:start + block_days])
+
+
+def store_percentile_bands(
+    store_path: str,
+    percentiles: List[float] = [10, 50, 90],
+    block_days: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Percentile bands of a path store, streamed one block of days at a time
+
+    Args:
+        store_path: .npy store file written by simulate_to_store
+        percentiles: List of percentiles to calculate
+        block_days: Days read per block (default fits STORE_BLOCK_BYTES)
+
+    Returns:
+        DataFrame with percentile bands over time, as calculate_percentile_bands
+    """
+    store = open_path_store(store_path)
+    bands = np.empty((len(percentiles), store.shape[0]))
+
+    for start, block in _store_day_blocks(store, block_days):
+        bands[:, start:start + len(block)] = _column_percentiles(block.T, percentiles)
+
+    data = {'Day': range(store.shape[0])}
+    for p, band in zip(percentiles, bands):
+        data[f'P{p}'] = band
+
+    return pd.DataFrame(data)
+
+
+def store_statistics(
+    store_path: str,
+    initial_value: float,
+    var_levels: Optional[List[float]] = None,
+    target_value: Optional[float] = None,
+    block_days: Optional[int] = None
+) -> Dict[str, float]:
+    """
+    Terminal and tail-risk statistics of a path store, streamed over days
+
+    Running peaks and drawdowns are carried from one block of days to the
+    next, so only a few per-path vectors are held in memory. Paths are
+    treated as equally weighted.
+
+    Args:
+        store_path: .npy store file written by simulate_to_store
+        initial_value: Starting portfolio value
+        var_levels: Confidence levels for VaR / CVaR (default TAIL_LEVELS)
+        target_value: Optional goal value
+
+    Returns:
+        Statistics dict with the same keys as _summarize_paths
+    """
+    store = open_path_store(store_path)
+    peaks = np.full(store.shape[1], -np.inf)
+    worst_ratio = np.ones(store.shape[1])
+
+    for _, block in _store_day_blocks(store, block_days):
+        running_peak = np.maximum.accumulate(block.astype(np.float64), axis=0)
+        np.maximum(running_peak, peaks, out=running_peak)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(running_peak > 0, block / running_peak, 1).min(axis=0)
+        np.minimum(worst_ratio, ratio, out=worst_ratio)
+        peaks = running_peak[-1]
+
+    terminal_values = np.asarray(store[-1], dtype=np.float64)
+    stats = _terminal_stats(terminal_values)
+    stats.update(_tail_stats(terminal_values, 1 - worst_ratio, peaks, initial_value, var_levels, target_value))
+    stats['std_error'] = _mean_standard_error(terminal_values)
+
+    return stats
+
+
+def export_store_to_parquet(
+    store_path: str,
+    parquet_path: str,
+    chunk_size: int = 50000,
+    every_n_days: int = 1
+) -> str:
+    """
+    Export a path store to Parquet, one row group per chunk of paths
+
+    Rows are paths and columns are days ('day_0', 'day_1', ...), plus a
+    'path' id column. Requires pyarrow (installed with streamlit).
+
+    Args:
+        store_path: .npy store file written by simulate_to_store
+        parquet_path: Destination Parquet file (overwritten)
+        chunk_size: Paths per row group
+        every_n_days: Keep every n-th day (the final day is always kept)
+
+    Returns:
+        The Parquet file path
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    store = open_path_store(store_path)
+    days = np.arange(0, store.shape[0], every_n_days)
+    if days[-1] != store.shape[0] - 1:
+        days = np.append(days, store.shape[0] - 1)
+    names = ['path'] + [f'day_{d}' for d in days]
+
+    parquet_dir = os.path.dirname(os.path.abspath(parquet_path))
+    os.makedirs(parquet_dir, exist_ok=True)
+
+    writer = None
+    try:
+        for start in range(0, store.shape[1], chunk_size):
+            stop = min(start + chunk_size, store.shape[1])
+            chunk = np.asarray(store[days, start:stop])
+            columns = [pa.array(np.arange(start, stop))] + [pa.array(row) for row in chunk]
+            table = pa.Table.from_arrays(columns, names=names)
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return parquet_path
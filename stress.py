@@ -0,0 +1,229 @@
+"""
+Historical stress testing: replay past market windows against current holdings
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, Tuple, Optional
+
+
+# Named market stress windows (start, end), inclusive
+STRESS_SCENARIOS = {
+    '2008 Financial Crisis': ('2008-09-01', '2009-03-09'),
+    '2011 US Downgrade': ('2011-07-22', '2011-10-03'),
+    'Q4 2018 Selloff': ('2018-09-20', '2018-12-24'),
+    'COVID Crash (2020)': ('2020-02-19', '2020-03-23'),
+    '2022 Rate Shock': ('2022-01-03', '2022-10-12'),
+}
+
+
+def _align_weights(returns: pd.DataFrame, weights: Dict[str, float]) -> Tuple[List[str], np.ndarray]:
+    """
+    Tickers with return history and their normalized weights
+
+    Args:
+        returns: Historical returns DataFrame
+        weights: Portfolio weights
+
+    Returns:
+        Tuple of (tickers, weights array)
+    """
+    tickers = [t for t in weights.keys() if t in returns.columns]
+    if not tickers:
+        return [], np.array([])
+
+    weights_array = np.array([weights[t] for t in tickers])
+    return tickers, weights_array / weights_array.sum()
+
+
+def build_scenario_tensor(
+    returns: pd.DataFrame,
+    windows: Dict[str, Tuple[str, str]]
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Stack named date windows of asset returns into one padded tensor
+
+    Windows are padded with zero returns to the longest window. Days on which
+    an asset has no data (not yet listed, missing quote) are also zero, i.e.
+    that position is held flat, and are flagged in the coverage mask.
+
+    Args:
+        returns: Historical returns DataFrame (may contain NaN)
+        windows: Mapping of scenario name to (start, end) dates
+
+    Returns:
+        Tuple of (returns tensor scenarios x days x assets, availability mask
+        of the same shape, scenario names in tensor order)
+    """
+    names = []
+    slices = []
+    for name, (start, end) in windows.items():
+        window = returns.loc[start:end]
+        if not window.empty:
+            names.append(name)
+            slices.append(window.values)
+
+    if not slices:
+        return np.zeros((0, 0, returns.shape[1])), np.zeros((0, 0, returns.shape[1]), dtype=bool), []
+
+    n_days = max(len(x) for x in slices)
+    tensor = np.zeros((len(slices), n_days, returns.shape[1]))
+    available = np.zeros(tensor.shape, dtype=bool)
+
+    for i, window in enumerate(slices):
+        tensor[i, :len(window)] = window
+        available[i, :len(window)] = ~np.isnan(window)
+
+    np.nan_to_num(tensor, copy=False)
+    return tensor, available, names
+
+
+def replay_scenarios(
+    tensor: np.ndarray,
+    weights_array: np.ndarray,
+    initial_value: float,
+    lengths: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Buy-and-hold replay of many return scenarios in one vectorized pass
+
+    Args:
+        tensor: Asset returns (scenarios x days x assets)
+        weights_array: Starting weights per asset
+        initial_value: Starting portfolio value
+        lengths: Real days per scenario when shorter windows are padded
+            (default: every day is real). Padded days hold the value flat
+            and are left out of the drawdown and worst day.
+
+    Returns:
+        Dictionary of per-scenario arrays: 'paths' (scenarios x days + 1),
+        'final_value', 'pnl', 'total_return', 'max_drawdown' and 'worst_day'
+    """
+    n_scenarios, n_days, _ = tensor.shape
+    if lengths is None:
+        lengths = np.full(n_scenarios, n_days)
+    real_days = np.arange(n_days) < np.asarray(lengths)[:, None]
+
+    # Each holding compounds on its own; the portfolio is their weighted sum
+    growth = np.cumprod(1 + tensor, axis=1)
+    paths = np.empty((n_scenarios, n_days + 1))
+    paths[:, 0] = initial_value
+    paths[:, 1:] = initial_value * (growth @ weights_array)
+
+    running_peak = np.maximum.accumulate(paths, axis=1)
+    daily_returns = paths[:, 1:] / paths[:, :-1] - 1
+    drawdowns = 1 - paths[:, 1:] / running_peak[:, 1:]
+
+    # Scenarios without a real day have neither a drawdown nor a worst day
+    has_days = np.asarray(lengths) > 0
+    worst_day = np.where(real_days, daily_returns, np.inf).min(axis=1, initial=np.inf)
+    max_drawdown = np.where(real_days, drawdowns, 0.0).max(axis=1, initial=0.0)
+
+    return {
+        'paths': paths,
+        'final_value': paths[:, -1],
+        'pnl': paths[:, -1] - initial_value,
+        'total_return': paths[:, -1] / initial_value - 1,
+        'max_drawdown': max_drawdown,
+        'worst_day': np.where(has_days, worst_day, 0.0)
+    }
+
+
+def run_stress_tests(
+    returns: pd.DataFrame,
+    weights: Dict[str, float],
+    initial_value: float,
+    scenarios: Optional[Dict[str, Tuple[str, str]]] = None
+) -> pd.DataFrame:
+    """
+    Replay named historical windows against the current holdings
+
+    Args:
+        returns: Historical returns DataFrame covering the windows (as from
+            get_returns_dataframe with dropna=False)
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        scenarios: Mapping of scenario name to (start, end) dates
+            (defaults to STRESS_SCENARIOS)
+
+    Returns:
+        DataFrame with one row per scenario that overlaps the data
+    """
+    tickers, weights_array = _align_weights(returns, weights)
+    if not tickers:
+        return pd.DataFrame()
+
+    windows = STRESS_SCENARIOS if scenarios is None else scenarios
+    tensor, available, names = build_scenario_tensor(returns[tickers], windows)
+    if not names:
+        return pd.DataFrame()
+
+    # Windows shorter than the longest are padded; only their real days count
+    window_days = np.array([len(returns.loc[windows[n][0]:windows[n][1]]) for n in names])
+    result = replay_scenarios(tensor, weights_array, initial_value, window_days)
+
+    # Share of the portfolio (by weight) with data on every day of the window
+    full_history = np.array([
+        available[i, :window_days[i]].all(axis=0) for i in range(len(names))
+    ])
+    coverage = full_history @ weights_array
+
+    return pd.DataFrame({
+        'Scenario': names,
+        'Start': [windows[n][0] for n in names],
+        'End': [windows[n][1] for n in names],
+        'Days': window_days,
+        'Return (%)': result['total_return'] * 100,
+        'P&L ($)': result['pnl'],
+        'Max Drawdown (%)': result['max_drawdown'] * 100,
+        'Worst Day (%)': result['worst_day'] * 100,
+        'Coverage (%)': coverage * 100
+    })
+
+
+def rolling_window_losses(
+    returns: pd.DataFrame,
+    weights: Dict[str, float],
+    initial_value: float,
+    window_days: int = 21,
+    step: int = 1
+) -> pd.DataFrame:
+    """
+    Replay every historical window of a given length as a stress scenario
+
+    The (scenarios x days x assets) tensor is a strided view of the returns
+    matrix, so hundreds of overlapping windows cost no extra copies before
+    the replay itself.
+
+    Args:
+        returns: Historical returns DataFrame
+        weights: Portfolio weights
+        initial_value: Starting portfolio value
+        window_days: Length of each window in trading days
+        step: Days between window starts
+
+    Returns:
+        DataFrame with one row per window, sorted from worst to best P&L
+    """
+    tickers, weights_array = _align_weights(returns, weights)
+    returns_subset = returns[tickers].dropna() if tickers else returns
+    if not tickers or len(returns_subset) < window_days:
+        return pd.DataFrame()
+
+    # sliding_window_view gives (windows x assets x days); replay wants days before assets
+    tensor = sliding_window_view(returns_subset.values, window_days, axis=0)[::step].transpose(0, 2, 1)
+    result = replay_scenarios(tensor, weights_array, initial_value)
+
+    starts = returns_subset.index[:len(returns_subset) - window_days + 1][::step]
+    ends = returns_subset.index[window_days - 1:][::step]
+
+    df = pd.DataFrame({
+        'Start': starts,
+        'End': ends,
+        'Return (%)': result['total_return'] * 100,
+        'P&L ($)': result['pnl'],
+        'Max Drawdown (%)': result['max_drawdown'] * 100,
+        'Worst Day (%)': result['worst_day'] * 100
+    })
+
+    return df.sort_values('P&L ($)').reset_index(drop=True)
@@ -115,6 +115,27 @@ def test_custom_modules():
         print(f"✗ analytics import failed: {e}")
         return False
 
+    try:
+        import stress
+        print("✓ stress module imported successfully")
+    except ImportError as e:
+        print(f"✗ stress import failed: {e}")
+        return False
+
+    try:
+        import charts
+        print("✓ charts module imported successfully")
+    except ImportError as e:
+        print(f"✗ charts import failed: {e}")
+        return False
+
+    try:
+        import context
+        print("✓ context module imported successfully")
+    except ImportError as e:
+        print(f"✗ context import failed: {e}")
+        return False
+
     try:
         import report
         print("✓ report module imported successfully")
@@ -161,6 +182,341 @@ def test_basic_functionality():
         print(f"✗ Simulation test failed: {e}")
         return False
 
+    try:
+        from simulate import historical_bootstrap
+
+        # Same seed must reproduce the same paths without touching global state
+        np.random.seed(0)
+        state_before = np.random.get_state()[1].copy()
+        paths_a, _ = historical_bootstrap(returns, weights, 10000, 30, 100, block_size=5, seed=7)
+        paths_b, _ = historical_bootstrap(returns, weights, 10000, 30, 100, block_size=5, seed=7)
+
+        assert np.array_equal(paths_a, paths_b)
+        assert np.array_equal(np.random.get_state()[1], state_before)
+
+        from simulate import BOOTSTRAP_METHODS
+        for method in BOOTSTRAP_METHODS:
+            paths, _ = historical_bootstrap(returns, weights, 10000, 30, 100, seed=7, method=method)
+            assert paths.shape == (100, 31) and np.isfinite(paths).all()
+        print("✓ Simulation seeding is reproducible and isolated")
+    except Exception as e:
+        print(f"✗ Seeding test failed: {e}")
+        return False
+
+    try:
+        from simulate import VARIANCE_REDUCTION_METHODS
+
+        errors = {}
+        for method in VARIANCE_REDUCTION_METHODS:
+            paths, stats = monte_carlo_gbm(returns, weights, 10000, 30, 256, seed=42, variance_reduction=method)
+            assert paths.shape == (256, 31)
+            errors[method] = stats['std_error']
+
+        assert errors['antithetic'] < errors['none']
+        assert errors['sobol'] < errors['none']
+        assert 0 < errors['control_variate'] < errors['none']
+
+        # Small samples can give negative control-variate weights; they are clipped
+        from simulate import _control_variate_weights
+        cv_weights = _control_variate_weights(np.array([0.0, 0.0, 0.0, 10.0]), -5.0)
+        assert cv_weights.min() >= 0 and abs(cv_weights.sum() - 1) < 1e-12
+        print("✓ Variance reduction lowers the standard error")
+    except Exception as e:
+        print(f"✗ Variance reduction test failed: {e}")
+        return False
+
+    try:
+        paths, stats = monte_carlo_gbm(returns, weights, 10000, 30, 1000, seed=42, target_value=10500)
+        _, chunked = monte_carlo_gbm(returns, weights, 10000, 30, 1000, seed=42, target_value=10500, chunk_size=250)
+
+        assert stats['cvar_95'] >= stats['var_95'] and stats['cvar_99'] >= stats['var_99']
+        assert 0 <= stats['prob_loss'] <= 1 and stats['prob_touch_target'] >= stats['prob_target']
+        assert abs(stats['var_95'] - (10000 - np.percentile(paths[:, -1], 5))) < 1e-6 * 10000
+        assert abs(chunked['var_95'] - stats['var_95']) < 1e-6 * 10000
+
+        # Statistics only: chunks are summarized and dropped, paths are never kept
+        no_paths, streamed = monte_carlo_gbm(returns, weights, 10000, 30, 1000, seed=42, target_value=10500,
+                                             chunk_size=250, return_paths=False)
+        assert no_paths.shape == (0, 31) and streamed == chunked
+        print("✓ Tail-risk metrics computed from simulation output")
+    except Exception as e:
+        print(f"✗ Tail-risk metrics test failed: {e}")
+        return False
+
+    try:
+        from simulate import calculate_percentile_bands
+
+        paths, _ = monte_carlo_gbm(returns, weights, 10000, 250, 500, seed=42)
+        bands = calculate_percentile_bands(paths, [5, 50, 95])
+        assert np.allclose(bands['P5'], np.percentile(paths, 5, axis=0))
+        assert np.allclose(bands['P95'], np.percentile(paths, 95, axis=0))
+
+        coarse = calculate_percentile_bands(paths, [5, 50, 95], max_points=50)
+        assert len(coarse) <= 50 and coarse['Day'].iloc[-1] == 250
+        assert np.allclose(coarse['P50'], bands['P50'].iloc[coarse['Day']])
+        print("✓ Percentile bands match np.percentile")
+    except Exception as e:
+        print(f"✗ Percentile band test failed: {e}")
+        return False
+
+    try:
+        from charts import decimate_series, histogram_bins
+
+        long_bands = calculate_percentile_bands(monte_carlo_gbm(returns, weights, 10000, 2000, 200, seed=1)[0])
+        for method in ['lttb', 'minmax']:
+            small = decimate_series(long_bands, 'Day', ['P10', 'P50', 'P90'], max_points=300, method=method)
+            assert len(small) <= 300 and small['Day'].iloc[0] == 0 and small['Day'].iloc[-1] == 2000
+            if method == 'minmax':
+                assert small['P90'].max() == long_bands['P90'].max()
+
+        bins_df = histogram_bins(paths[:, -1], bins=50)
+        assert len(bins_df) == 50 and bins_df['Count'].sum() == len(paths)
+        print("✓ Chart decimation and histogram binning working correctly")
+    except Exception as e:
+        print(f"✗ Chart preparation test failed: {e}")
+        return False
+
+    try:
+        from simulate import monte_carlo_adaptive
+
+        paths, stats = monte_carlo_adaptive(returns, weights, 10000, 30, target_precision=0.005, seed=42)
+
+        assert stats['converged']
+        assert stats['p10_precision'] <= 0.005 and stats['p50_precision'] <= 0.005
+        assert paths.shape == (stats['n_simulations'], 31)
+        print("✓ Adaptive simulation converges to the target precision")
+    except Exception as e:
+        print(f"✗ Adaptive simulation test failed: {e}")
+        return False
+
+    try:
+        from simulate import monte_carlo_sweep
+
+        sweep = monte_carlo_sweep(returns, weights, 10000, [-0.05, 0.0, 0.05], [0.5, 1.0], [10, 30], 1000, seed=42)
+        assert len(sweep) == 12
+
+        # The matching cell reproduces a direct run with the same draws
+        _, direct = monte_carlo_gbm(returns, weights, 10000, 30, 1000, seed=42, return_tilt=0.05)
+        cell = sweep[(sweep['return_tilt'] == 0.05) & (sweep['volatility_tilt'] == 1.0) & (sweep['horizon_days'] == 30)]
+        for key, direct_key in [('p10', 'p10'), ('p50', 'p50'), ('mean', 'mean'), ('cvar', 'cvar_95')]:
+            assert abs(cell[key].iloc[0] - direct[direct_key]) < 1e-6 * 10000
+        print("✓ What-if sweep matches direct simulation")
+    except Exception as e:
+        print(f"✗ What-if sweep test failed: {e}")
+        return False
+
+    try:
+        # Same resampled days in both precisions, so any gap is rounding error.
+        # Tolerance: 1e-5 relative on every reported percentile over one year.
+        paths64, stats64 = historical_bootstrap(returns, weights, 10000, 252, 2000, seed=3)
+        paths32, stats32 = historical_bootstrap(returns, weights, 10000, 252, 2000, seed=3, precision='float32')
+
+        assert paths32.dtype == np.float32
+        for key in ['p10', 'p25', 'p50', 'p75', 'p90']:
+            assert abs(stats32[key] - stats64[key]) / stats64[key] < 1e-5
+        print("✓ Float32 simulation stays within tolerance of float64")
+    except Exception as e:
+        print(f"✗ Float32 precision test failed: {e}")
+        return False
+
+    try:
+        from simulate import monte_carlo_student_t, monte_carlo_garch
+
+        paths, stats = monte_carlo_student_t(returns, weights, 10000, 30, 100, seed=42)
+        assert paths.shape == (100, 31) and stats['df'] > 2 and paths.dtype == np.float32
+        paths, stats = monte_carlo_garch(returns, weights, 10000, 30, 100, seed=42)
+        assert paths.shape == (100, 31) and stats['alpha'] + stats['beta'] < 1 and paths.dtype == np.float32
+        paths, _ = monte_carlo_student_t(returns, weights, 10000, 30, 100, seed=42, precision='float64')
+        assert paths.dtype == np.float64
+        print("✓ Student-t and GARCH simulation engines working correctly")
+    except Exception as e:
+        print(f"✗ Fat-tailed engine test failed: {e}")
+        return False
+
+    try:
+        from simulate import monte_carlo_regime_switching, fit_regimes
+
+        regimes = fit_regimes(returns, weights, n_regimes=3)
+        assert np.allclose(regimes['transition_matrix'].sum(axis=1), 1)
+        paths, stats = monte_carlo_regime_switching(returns, weights, 10000, 30, 100, seed=42)
+        assert paths.shape == (100, 31) and np.isfinite(paths).all()
+        assert abs(stats['time_in_calm'] + stats['time_in_stressed'] + stats['time_in_crisis'] - 1) < 1e-9
+        print("✓ Regime-switching simulation working correctly")
+    except Exception as e:
+        print(f"✗ Regime-switching test failed: {e}")
+        return False
+
+    try:
+        from simulate import simulate_rebalanced_portfolio
+
+        paths, stats = simulate_rebalanced_portfolio(returns, weights, 10000, 60, 100, rebalance='none', seed=42)
+        assert paths.shape == (100, 61) and stats['avg_costs'] == 0
+
+        _, monthly = simulate_rebalanced_portfolio(returns, weights, 10000, 60, 100, rebalance='monthly', seed=42)
+        _, funded = simulate_rebalanced_portfolio(returns, weights, 10000, 60, 100, rebalance='monthly',
+                                                  contribution=500, seed=42)
+        assert monthly['avg_rebalances'] == 2 and monthly['avg_costs'] > 0
+        assert funded['p50'] > monthly['p50']
+        print("✓ Rebalancing simulation working correctly")
+    except Exception as e:
+        print(f"✗ Rebalancing simulation test failed: {e}")
+        return False
+
+    try:
+        from simulate import SimulationCache, run_cached_simulation
+
+        cache = SimulationCache()
+        first = run_cached_simulation(cache, monte_carlo_gbm, returns, weights, 10000, 30, n_simulations=100, seed=42)
+        second = run_cached_simulation(cache, monte_carlo_gbm, returns, weights, 10000, 30, n_simulations=100, seed=42)
+        other = run_cached_simulation(cache, monte_carlo_gbm, returns, weights, 10000, 30, n_simulations=100, seed=43)
+
+        assert second['terminal_values'] is first['terminal_values'] and second['stats'] == first['stats']
+        assert other['stats'] != first['stats']
+        assert cache.hits == 1 and len(cache) == 2
+
+        # Results are shared across sessions: callers cannot modify the cached copy
+        second['stats']['mean'] = 0.0
+        second['bands'].iloc[:, 1:] = 0.0
+        assert not second['terminal_values'].flags.writeable
+        third = run_cached_simulation(cache, monte_carlo_gbm, returns, weights, 10000, 30, n_simulations=100, seed=42)
+        assert third['stats'] == first['stats'] and third['bands'].equals(first['bands'])
+
+        # A budget that fits one result keeps only the most recent one
+        small = SimulationCache(max_bytes=cache.nbytes // 2 + 1)
+        run_cached_simulation(small, monte_carlo_gbm, returns, weights, 10000, 30, n_simulations=100, seed=42)
+        run_cached_simulation(small, monte_carlo_gbm, returns, weights, 10000, 30, n_simulations=100, seed=43)
+        assert len(small) == 1
+
+        # Arguments are keyed by value: large arrays by content, and objects without one are not cached
+        from simulate import _cache_token
+        grid = np.zeros(5000)
+        edited_grid = grid.copy()
+        edited_grid[2500] = 1.0
+        assert repr(grid) == repr(edited_grid) and _cache_token(grid) != _cache_token(edited_grid)
+        assert _cache_token(grid) == _cache_token(grid.copy()) and _cache_token(object()) is None
+        entries = len(cache)
+        run_cached_simulation(cache, monte_carlo_gbm, returns, weights, 10000, 30, n_simulations=100, seed=42, var_levels=np.array([0.95]))
+        run_cached_simulation(cache, monte_carlo_gbm, returns, weights, 10000, 30, n_simulations=100, seed=42, var_levels=np.array([0.95], dtype=object))
+        assert len(cache) == entries + 1
+        print("✓ Simulation cache reuses identical runs")
+    except Exception as e:
+        print(f"✗ Simulation cache test failed: {e}")
+        return False
+
+    try:
+        from context import get_returns_context
+        from analytics import calculate_contribution_to_risk
+        from optimize import calculate_portfolio_performance
+
+        context = get_returns_context(returns)
+        assert get_returns_context(returns.copy()) is context
+        assert np.allclose(context.annual_cov, returns.cov().values * 252)
+        assert np.allclose(context.cholesky @ context.cholesky.T, context.cov)
+
+        # Subsets slice the shared statistics, pairwise like pandas even with gaps
+        gappy = returns.copy()
+        gappy.iloc[:20, 0] = np.nan
+        tickers = list(returns.columns[:2])
+        subset = get_returns_context(gappy).subset(tickers)
+        assert np.allclose(subset.cov, gappy[tickers].cov().values)
+        assert np.allclose(subset.corr.values, gappy[tickers].corr().values)
+
+        # Callers get their own correlation matrix
+        mutated = context.corr
+        mutated.iloc[0, 1] = 5.0
+        assert context.corr.iloc[0, 1] != 5.0
+
+        # Every date is hashed, and a frame modified in place gets a new fingerprint
+        from context import fingerprint_returns
+        shifted = returns.copy()
+        shifted.index = shifted.index[:1].append(shifted.index[1:-1] + pd.Timedelta(hours=1)).append(shifted.index[-1:])
+        assert fingerprint_returns(shifted) != context.fingerprint
+        edited = returns.copy()
+        before = get_returns_context(edited)
+        edited.iloc[5, 0] += 0.01
+        assert get_returns_context(edited) is not before
+        assert get_returns_context(edited, context.fingerprint) is context
+
+        from_frame = calculate_portfolio_performance(weights, returns)
+        from_context = calculate_portfolio_performance(weights, context)
+        assert abs(from_frame['volatility'] - from_context['volatility']) < 1e-12
+        assert calculate_contribution_to_risk(context, weights).equals(calculate_contribution_to_risk(returns, weights))
+        print("✓ Shared returns context working correctly")
+    except Exception as e:
+        print(f"✗ Returns context test failed: {e}")
+        return False
+
+    try:
+        import os
+        import tempfile
+        from simulate import (
+            simulate_to_store, open_path_store, store_statistics, store_percentile_bands,
+            calculate_percentile_bands, export_store_to_parquet
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, 'paths.npy')
+            stats = simulate_to_store(store_path, monte_carlo_gbm, returns, weights, 10000, 30, 1000,
+                                      chunk_size=300, seed=42)
+            store = open_path_store(store_path)
+            assert store.shape == (31, 1000)
+
+            streamed = store_statistics(store_path, 10000, block_days=4)
+            assert abs(streamed['var_95'] - stats['var_95']) < 1e-6 * 10000
+            bands = store_percentile_bands(store_path, block_days=4)
+            assert np.allclose(bands.values, calculate_percentile_bands(np.asarray(store).T).values)
+
+            # Parquet export round-trips the stored paths, thinned by day
+            parquet_path = export_store_to_parquet(store_path, os.path.join(tmp, 'paths.parquet'),
+                                                   chunk_size=400, every_n_days=7)
+            exported = pd.read_parquet(parquet_path)
+            assert list(exported.columns) == ['path'] + [f'day_{d}' for d in [0, 7, 14, 21, 28, 30]]
+            assert np.array_equal(exported['path'].values, np.arange(1000))
+            assert np.array_equal(exported['day_30'].values, store[30])
+            del store
+
+            # Simulators without a precision argument can be stored too
+            from simulate import simulate_rebalanced_portfolio
+            rebalanced_path = os.path.join(tmp, 'rebalanced.npy')
+            simulate_to_store(rebalanced_path, simulate_rebalanced_portfolio, returns, weights, 10000, 30, 200,
+                              chunk_size=100, seed=42)
+            rebalanced = open_path_store(rebalanced_path)
+            assert rebalanced.shape == (31, 200) and np.isfinite(rebalanced).all()
+            del rebalanced
+        print("✓ Memory-mapped path store working correctly")
+    except Exception as e:
+        print(f"✗ Path store test failed: {e}")
+        return False
+
+    try:
+        from stress import run_stress_tests, rolling_window_losses
+
+        # A ticker listed mid-sample is held flat before its first return
+        crisis_returns = returns.copy()
+        crisis_returns.iloc[:10, 1] = np.nan
+        windows = {'Early': ('2023-01-01', '2023-01-31'), 'Late': ('2023-03-01', '2023-03-20'),
+                   'Missing': ('2019-01-01', '2019-02-01')}
+        results = run_stress_tests(crisis_returns, weights, 10000, scenarios=windows)
+
+        assert list(results['Scenario']) == ['Early', 'Late']
+        late = crisis_returns.loc['2023-03-01':'2023-03-20']
+        expected = ((1 + late).prod() * 0.5).sum() - 1
+        assert abs(results['Return (%)'].iloc[1] - expected * 100) < 1e-8
+        assert results['Coverage (%)'].tolist() == [50.0, 100.0]
+
+        # Padding a short window to the longest one must not add 0% days
+        rising = returns.copy()
+        rising.loc['2023-03-01':'2023-03-20'] = 0.01
+        padded = run_stress_tests(rising, weights, 10000, scenarios=windows)
+        assert abs(padded['Worst Day (%)'].iloc[1] - 1.0) < 1e-8 and padded['Max Drawdown (%)'].iloc[1] == 0
+
+        rolling = rolling_window_losses(returns, weights, 10000, window_days=21)
+        assert len(rolling) == 80 and rolling['P&L ($)'].is_monotonic_increasing
+        print("✓ Stress scenario replay working correctly")
+    except Exception as e:
+        print(f"✗ Stress test failed: {e}")
+        return False
+
     try:
         import numpy as np
         import pandas as pd
@@ -177,11 +533,246 @@ def test_basic_functionality():
 
         assert len(weights) > 0
         assert abs(sum(weights.values()) - 1.0) < 0.01
+
+        # The tangency portfolio beats every point of the frontier on Sharpe
+        from optimize import efficient_frontier_cla
+        details = optimize_max_sharpe(returns, risk_free_rate=0.02, return_details=True)
+        _, _, frontier_sharpes = efficient_frontier_cla(returns, n_points=500, risk_free_rate=0.02)
+        assert details['status'] == 'optimal' and details['weights'] == weights
+        assert details['sharpe_ratio'] >= frontier_sharpes.max() - 1e-6
         print("✓ Portfolio optimization working correctly")
     except Exception as e:
         print(f"✗ Optimization test failed: {e}")
         return False
 
+    try:
+        import optimize as opt
+
+        # The NumPy fast path must agree with the cvxpy formulation
+        fast = opt.optimize_max_sharpe(returns, risk_free_rate=0.02, return_details=True)
+        fast_min_var = opt.optimize_min_variance(returns)
+        fast_path_limit, opt.FAST_PATH_MAX_ASSETS = opt.FAST_PATH_MAX_ASSETS, 0
+        try:
+            generic = opt.optimize_max_sharpe(returns, risk_free_rate=0.02, return_details=True)
+            generic_min_var = opt.optimize_min_variance(returns)
+        finally:
+            opt.FAST_PATH_MAX_ASSETS = fast_path_limit
+
+        assert fast['solver'] in ('closed-form', 'active-set') and generic['solver'] == 'CLARABEL'
+        assert abs(fast['sharpe_ratio'] - generic['sharpe_ratio']) < 1e-6
+        assert all(abs(fast_min_var.get(k, 0) - v) < 1e-4 for k, v in generic_min_var.items())
+
+        # A bound that binds goes through the active-set method
+        Sigma = np.array([[0.04, 0.018, 0.0], [0.018, 0.01, 0.0], [0.0, 0.0, 0.09]])
+        w, iterations, converged = opt._active_set_qp(Sigma, np.ones(3), 1.0, 0)
+        assert converged and abs(w.sum() - 1) < 1e-12 and w.min() >= 0 and w[0] == 0
+
+        # Running out of iterations is reported, and the public functions fall back to cvxpy
+        _, _, converged = opt._active_set_qp(Sigma, np.ones(3), 1.0, 0, max_iter=1)
+        assert not converged
+        active_set_qp = opt._active_set_qp
+        opt._active_set_qp = lambda *args: active_set_qp(*args, max_iter=1)
+        try:
+            unconverged, unconverged_details = opt._fast_min_variance(Sigma)
+            bound_returns = pd.DataFrame(np.random.default_rng(5).multivariate_normal(np.zeros(3), Sigma / 252, 500))
+            fallback = opt.optimize_min_variance(bound_returns)
+        finally:
+            opt._active_set_qp = active_set_qp
+        assert unconverged is None and unconverged_details['status'] == 'max_iter'
+        assert all(abs(fallback.get(k, 0) - v) < 1e-4 for k, v in opt.optimize_min_variance(bound_returns).items())
+        print("✓ Solver-free fast path matches cvxpy")
+    except Exception as e:
+        print(f"✗ Fast path test failed: {e}")
+        return False
+
+    try:
+        import optimize as opt
+
+        sample = opt.calculate_covariance_matrix(returns)
+        for method in ('ledoit_wolf', 'oas'):
+            shrunk = opt.calculate_covariance_matrix(returns, method)
+            assert shrunk.shape == sample.shape and np.linalg.eigvalsh(shrunk).min() > 0
+
+        loadings, specific_variance = opt.calculate_factor_model(returns, n_factors=2)
+        factor_cov = opt.calculate_covariance_matrix(returns, 'factor')
+        assert loadings.shape[0] == len(returns.columns) and specific_variance.min() > 0
+        assert np.allclose(np.diag(factor_cov), np.diag(sample))
+
+        # The factored QP must match the dense one built from the same matrix
+        fast_path_limit, opt.FAST_PATH_MAX_ASSETS = opt.FAST_PATH_MAX_ASSETS, 0
+        try:
+            factored = opt.optimize_min_variance(returns, cov_method='factor')
+        finally:
+            opt.FAST_PATH_MAX_ASSETS = fast_path_limit
+        dense = opt.optimize_min_variance(returns, cov_method='factor')
+        assert all(abs(factored.get(k, 0) - v) < 1e-4 for k, v in dense.items())
+
+        # Performance of a sub-portfolio uses the full universe's risk model
+        wide = pd.DataFrame(np.random.default_rng(11).normal(0, 0.01, (200, 4)), columns=list('ABCD'))
+        partial = {'A': 0.5, 'B': 0.3, 'C': 0.2}
+        w_partial = np.array([0.5, 0.3, 0.2])
+        for method in ('factor', 'ledoit_wolf'):
+            universe_cov = opt.calculate_covariance_matrix(wide, method)[:3, :3]
+            perf = opt.calculate_portfolio_performance(partial, wide, cov_method=method)
+            assert abs(perf['volatility'] - np.sqrt(w_partial @ universe_cov @ w_partial)) < 1e-12
+        print("✓ Shrinkage and factor covariance estimators working correctly")
+    except Exception as e:
+        print(f"✗ Covariance estimator test failed: {e}")
+        return False
+
+    try:
+        from optimize import optimize_risk_parity
+        from analytics import calculate_contribution_to_risk
+
+        tickers = list(returns.columns)
+        erc = optimize_risk_parity(returns, return_details=True)
+        ccd = optimize_risk_parity(returns, method='ccd', return_details=True)
+        assert erc['status'] == 'optimal' and ccd['status'] == 'optimal'
+        assert all(abs(erc['weights'][t] - ccd['weights'][t]) < 1e-8 for t in tickers)
+
+        contributions = calculate_contribution_to_risk(returns, erc['weights'])['Risk Contribution (%)']
+        assert np.allclose(contributions, 100 / len(tickers))
+
+        # Budgets set the shares of risk; a zero budget means no position
+        budgets = {tickers[0]: 3, tickers[1]: 1}
+        budgeted = optimize_risk_parity(returns, budgets, return_details=True)
+        assert set(budgeted['weights']) == set(budgets)
+        assert abs(budgeted['risk_contributions'][tickers[0]] - 0.75) < 1e-8
+
+        # Hundreds of holdings: CCD converges alone on a market-driven universe,
+        # and hands off to Newton when holdings hedge each other
+        rng = np.random.default_rng(3)
+        market = np.outer(rng.normal(0, 0.01, 750), rng.uniform(0.5, 1.5, 300))
+        universe = pd.DataFrame(market + rng.normal(size=(750, 300)) * rng.uniform(0.01, 0.025, 300))
+        hedged = pd.DataFrame(rng.normal(size=(900, 5)) @ rng.normal(size=(5, 300)) * 0.01
+                              + rng.normal(size=(900, 300)) * 0.01)
+        for data, solver in [(universe, 'ccd'), (hedged, 'ccd+newton')]:
+            large_ccd = optimize_risk_parity(data, method='ccd', return_details=True)
+            large_newton = optimize_risk_parity(data, return_details=True)
+            assert large_ccd['status'] == 'optimal' and large_ccd['solver'] == solver
+            assert max(abs(large_ccd['weights'][t] - large_newton['weights'][t]) for t in data.columns) < 1e-8
+        print("✓ Risk parity optimizer matches its risk budgets")
+    except Exception as e:
+        print(f"✗ Risk parity test failed: {e}")
+        return False
+
+    try:
+        from optimize import optimize_hrp, _cluster_variance
+
+        hrp = optimize_hrp(returns)
+        assert set(hrp) == set(returns.columns) and abs(sum(hrp.values()) - 1) < 1e-12
+        assert min(hrp.values()) > 0
+
+        # Two uncorrelated assets: bisection reduces to inverse-variance weights
+        Sigma = np.diag([0.04, 0.01])
+        assert abs(_cluster_variance(Sigma, np.array([0, 1])) - 0.008) < 1e-12
+        pair = pd.DataFrame({'A': np.tile([0.02, -0.02], 50), 'B': np.tile([0.01, 0.01, -0.01, -0.01], 25)})
+        pair_weights = optimize_hrp(pair)
+        assert abs(pair_weights['A'] / pair_weights['B'] - 0.25) < 1e-6
+        print("✓ Hierarchical risk parity allocation working correctly")
+    except Exception as e:
+        print(f"✗ HRP test failed: {e}")
+        return False
+
+    try:
+        from scipy import sparse
+        from optimize import optimize_cvar, _scenario_cvar
+        from simulate import bootstrap_scenarios
+
+        scenarios = bootstrap_scenarios(returns, horizon_days=5, n_scenarios=2000, seed=42)
+        assert scenarios.shape == (2000, len(returns.columns))
+
+        generated = optimize_cvar(scenarios, 0.95, return_details=True)
+        full = optimize_cvar(scenarios, 0.95, method='lp', return_details=True)
+        assert generated['status'] == 'optimal' and abs(generated['cvar'] - full['cvar']) < 1e-8
+
+        # Worst 5% of 2000 scenarios: the mean of the 100 largest losses
+        w = np.array([generated['weights'].get(t, 0) for t in scenarios.columns])
+        losses = -(scenarios.values @ w)
+        assert abs(_scenario_cvar(losses, 0.95)[0] - np.sort(losses)[-100:].mean()) < 1e-12
+
+        # Return maximized under a looser cap, from sparse batches
+        cap = generated['cvar'] * 1.2
+        batches = [sparse.csr_matrix(scenarios.values[:1200]), scenarios.values[1200:]]
+        capped = optimize_cvar(batches, 0.95, max_cvar=cap, tickers=list(scenarios.columns), return_details=True)
+        capped_lp = optimize_cvar(scenarios, 0.95, max_cvar=cap, method='lp', return_details=True)
+        assert capped['cvar'] <= cap + 1e-8 and capped['expected_return'] >= generated['expected_return']
+        assert abs(capped['expected_return'] - capped_lp['expected_return']) < 1e-8
+        print("✓ CVaR optimization over scenarios working correctly")
+    except Exception as e:
+        print(f"✗ CVaR optimization test failed: {e}")
+        return False
+
+    try:
+        from optimize import get_constrained_optimizer, optimize_min_variance
+
+        rng = np.random.default_rng(7)
+        universe = pd.DataFrame(
+            rng.normal(0.0004, 0.01, (250, 6)) * np.array([1.0, 1.2, 0.8, 1.5, 0.9, 1.1]),
+            columns=['AAPL', 'MSFT', 'NVDA', 'JPM', 'BAC', 'XOM']
+        )
+        sectors = {'AAPL': 'Technology', 'MSFT': 'Technology', 'NVDA': 'Technology',
+                   'JPM': 'Finance', 'BAC': 'Finance', 'XOM': 'Energy'}
+        optimizer = get_constrained_optimizer(universe, 'min_variance', sectors)
+        assert get_constrained_optimizer(universe, 'min_variance', sectors) is optimizer
+
+        # Without limits the constrained problem is the plain minimum-variance portfolio
+        unconstrained = optimizer.solve()
+        reference = optimize_min_variance(universe)
+        assert max(abs(unconstrained.get(t, 0) - reference.get(t, 0)) for t in universe.columns) < 1e-6
+
+        current = {t: 1 / 6 for t in universe.columns}
+        limited = optimizer.solve(
+            max_weight=0.3, sector_caps={'Technology': 0.4}, current_weights=current,
+            max_turnover=0.5, return_details=True
+        )
+        assert limited['status'] == 'optimal'
+        assert max(limited['weights'].values()) <= 0.3 + 1e-3
+        assert limited['sector_weights']['Technology'] <= 0.4 + 1e-3
+        assert limited['turnover'] <= 0.5 + 1e-3
+
+        # Holdings limit keeps the largest positions; infeasible limits give no weights
+        concentrated = optimizer.solve(max_assets=3, min_weight=0.1, return_details=True)
+        assert concentrated['n_holdings'] <= 3 and min(concentrated['weights'].values()) >= 0.1 - 1e-3
+        assert optimizer.solve(min_weight=0.2) == {}
+
+        # Minimum weights too large for every asset still fit the holdings kept
+        floor = optimizer.solve(max_assets=3, min_weight=0.2, return_details=True)
+        assert floor['status'] == 'optimal' and floor['n_holdings'] <= 3
+        assert min(floor['weights'].values()) >= 0.2 - 1e-3
+        print("✓ Constrained optimization working correctly")
+    except Exception as e:
+        print(f"✗ Constrained optimization test failed: {e}")
+        return False
+
+    try:
+        from optimize import generate_efficient_frontier, optimize_min_variance, calculate_portfolio_performance, calculate_expected_returns
+
+        ef_returns, ef_vols, ef_sharpes = generate_efficient_frontier(returns, n_points=20)
+        assert len(ef_returns) == 20 and np.all(np.diff(ef_returns) >= -1e-8)
+
+        min_var = calculate_portfolio_performance(optimize_min_variance(returns), returns)
+        assert abs(ef_vols.min() - min_var['volatility']) < 1e-4
+
+        # The parametric QP fallback lands on the same frontier
+        from optimize import _parametric_frontier_weights, _frontier_statistics, _risk_model
+        mu = calculate_expected_returns(returns)
+        Sigma, factors = _risk_model(returns, 'sample')
+        qp_weights = _parametric_frontier_weights(mu, Sigma, factors, np.linspace(mu.min(), mu.max(), 20))
+        _, qp_vols, _ = _frontier_statistics(qp_weights, mu, Sigma, 0.02)
+        assert len(qp_vols) == 20 and np.allclose(qp_vols, ef_vols, atol=1e-5)
+
+        from optimize import critical_line_algorithm, efficient_frontier_cla, calculate_expected_returns, calculate_covariance_matrix
+
+        corners, lambdas = critical_line_algorithm(calculate_expected_returns(returns), calculate_covariance_matrix(returns))
+        assert all(abs(c.sum() - 1) < 1e-10 and c.min() >= -1e-12 for c in corners) and lambdas[-1] == 0
+        cla_returns, cla_vols, _ = efficient_frontier_cla(returns, n_points=200)
+        assert len(cla_returns) == 200 and abs(cla_vols.min() - min_var['volatility']) < 1e-4
+        print("✓ Efficient frontier working correctly")
+    except Exception as e:
+        print(f"✗ Efficient frontier test failed: {e}")
+        return False
+
     return True
 
 